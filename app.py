@@ -4,9 +4,12 @@ from datetime import datetime
 import os
 
 # Import database setup
-from db_setup import initialize_sample_data
+from db_setup import PENDING_MIGRATION_ERROR, initialize_sample_data, session_scope
 from auth import authenticate_user, register_user, logout, get_current_user, is_authenticated
 from data_manager import initialize_data
+from passwords import PasswordHasherBusy
+from instrumentation import query_stats, install, debug_panel_enabled, render_debug_panel
+from profiling import RENDER_PROFILING, render_profile_panel
 from dashboards.faculty import faculty_dashboard
 from dashboards.dean import dean_dashboard
 from dashboards.student import student_dashboard
@@ -18,6 +21,11 @@ st.set_page_config(
     layout="wide"
 )
 
+# Migrations that delete duplicate ratings only run through `python manage.py migrate`
+if PENDING_MIGRATION_ERROR is not None:
+    st.error(str(PENDING_MIGRATION_ERROR))
+    st.stop()
+
 # Initialize session state variables if they don't exist
 if 'authenticated' not in st.session_state:
     st.session_state.authenticated = False
@@ -28,60 +36,91 @@ if 'username' not in st.session_state:
 if 'current_menu' not in st.session_state:
     st.session_state.current_menu = "Login"
 
-# Initialize database and sample data
-initialize_sample_data()
-
-# Initialize other data (like current semester)
-initialize_data()
-
-# App header
-st.title("Faculty Appraisal System")
-
-# Side navigation
-if is_authenticated():
-    user = get_current_user()
-    with st.sidebar:
-        st.write(f"Welcome, {user['name']} ({user['role']})")
-        st.button("Logout", on_click=logout)
+# Time every SQL statement the app executes
+install()
 
-# Main content area
-if not is_authenticated():
-    # Authentication page (Login/Register)
-    tab1, tab2 = st.tabs(["Login", "Register"])
+# Render the page with one database session shared by every data access call in this rerun,
+# attributing the rerun's statements to the dashboard it renders
+with query_stats.track_rerun(), session_scope():
+    # Initialize database and sample data
+    initialize_sample_data()
     
-    with tab1:
-        st.subheader("Login")
-        login_username = st.text_input("Username", key="login_username")
-        login_password = st.text_input("Password", type="password", key="login_password")
-        login_role = st.selectbox("Role", ["Faculty", "Dean", "Student"], key="login_role")
-        
-        if st.button("Login", key="login_btn"):
-            if authenticate_user(login_username, login_password, login_role.lower()):
-                st.success("Login successful!")
-                st.rerun()
-            else:
-                st.error("Invalid credentials. Please try again.")
+    # Initialize other data (like current semester)
+    initialize_data()
+    
+    # App header
+    st.title("Faculty Appraisal System")
+    
+    # Side navigation
+    if is_authenticated():
+        user = get_current_user()
+        with st.sidebar:
+            st.write(f"Welcome, {user['name']} ({user['role']})")
+            st.button("Logout", on_click=logout)
     
-    with tab2:
-        st.subheader("Register")
-        register_name = st.text_input("Full Name", key="register_name")
-        register_username = st.text_input("Username", key="register_username")
-        register_password = st.text_input("Password", type="password", key="register_password")
-        register_role = st.selectbox("Role", ["Faculty", "Dean", "Student"], key="register_role")
+    # Main content area
+    if not is_authenticated():
+        query_stats.set_dashboard("login")
         
-        if st.button("Register", key="register_btn"):
-            if register_name and register_username and register_password:
-                if register_user(register_username, register_password, register_name, register_role.lower()):
-                    st.success("Registration successful! Please login.")
+        # Authentication page (Login/Register)
+        tab1, tab2 = st.tabs(["Login", "Register"])
+        
+        with tab1:
+            st.subheader("Login")
+            login_username = st.text_input("Username", key="login_username")
+            login_password = st.text_input("Password", type="password", key="login_password")
+            login_role = st.selectbox("Role", ["Faculty", "Dean", "Student"], key="login_role")
+            
+            if st.button("Login", key="login_btn"):
+                try:
+                    authenticated = authenticate_user(login_username, login_password, login_role.lower())
+                except PasswordHasherBusy as error:
+                    st.error(str(error))
+                else:
+                    if authenticated:
+                        st.success("Login successful!")
+                        st.rerun()
+                    else:
+                        st.error("Invalid credentials. Please try again.")
+        
+        with tab2:
+            st.subheader("Register")
+            register_name = st.text_input("Full Name", key="register_name")
+            register_username = st.text_input("Username", key="register_username")
+            register_password = st.text_input("Password", type="password", key="register_password")
+            register_role = st.selectbox("Role", ["Faculty", "Dean", "Student"], key="register_role")
+            
+            if st.button("Register", key="register_btn"):
+                if register_name and register_username and register_password:
+                    try:
+                        registered = register_user(register_username, register_password, register_name, register_role.lower())
+                    except PasswordHasherBusy as error:
+                        st.error(str(error))
+                    else:
+                        if registered:
+                            st.success("Registration successful! Please login.")
+                        else:
+                            st.error("Username already exists. Please choose another.")
                 else:
-                    st.error("Username already exists. Please choose another.")
-            else:
-                st.error("All fields are required.")
-else:
-    # Display dashboard based on user role
-    if st.session_state.user_role == "faculty":
-        faculty_dashboard()
-    elif st.session_state.user_role == "dean":
-        dean_dashboard()
-    elif st.session_state.user_role == "student":
-        student_dashboard()
+                    st.error("All fields are required.")
+    else:
+        # Display dashboard based on user role
+        query_stats.set_dashboard(st.session_state.user_role)
+        if st.session_state.user_role == "faculty":
+            faculty_dashboard()
+        elif st.session_state.user_role == "dean":
+            dean_dashboard()
+        elif st.session_state.user_role == "student":
+            student_dashboard()
+
+# Optional SQL statistics for administrators, enabled with SQL_DEBUG_PANEL=1
+if debug_panel_enabled():
+    render_debug_panel()
+
+# Section timings of the last profiled dashboard render, enabled with RENDER_PROFILING=1
+if RENDER_PROFILING:
+    render_profile_panel()
+
+# Machine-readable stats for offline analysis
+if os.environ.get('SQL_STATS_PATH'):
+    query_stats.dump(os.environ['SQL_STATS_PATH'])
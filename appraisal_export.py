@@ -0,0 +1,150 @@
+import io
+import csv
+from sqlalchemy import case, select
+from db_setup import session_scope, User, Publication, Experience, Feedback
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # optional, only needed for Parquet exports
+    pyarrow = None
+
+try:
+    import openpyxl
+except ImportError:  # optional, only needed for XLSX exports
+    openpyxl = None
+
+# Rows fetched from the database and written per chunk
+EXPORT_CHUNK_SIZE = 2000
+
+# Formats that hold one dataset per file; XLSX holds one sheet per dataset
+SINGLE_DATASET_FORMATS = ('csv', 'parquet')
+EXPORT_FORMATS = SINGLE_DATASET_FORMATS + ('xlsx',)
+
+MIME_TYPES = {
+    'csv': "text/csv",
+    'parquet': "application/vnd.apache.parquet",
+    'xlsx': "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+def _publications_query():
+    return select(
+        User.username.label('faculty_username'),
+        User.name.label('faculty_name'),
+        Publication.title,
+        Publication.journal,
+        Publication.year,
+        Publication.doi
+    ).join(User, Publication.faculty_id == User.id).order_by(Publication.faculty_id, Publication.id)
+
+def _experiences_query():
+    return select(
+        User.username.label('faculty_username'),
+        User.name.label('faculty_name'),
+        Experience.institution,
+        Experience.role,
+        Experience.duration,
+        Experience.description
+    ).join(User, Experience.faculty_id == User.id).order_by(Experience.faculty_id, Experience.id)
+
+def _feedback_query():
+    # Reviewers are reported by role only, as on the dashboards
+    return select(
+        User.username.label('faculty_username'),
+        User.name.label('faculty_name'),
+        case((Feedback.dean_id.isnot(None), 'dean'), else_='student').label('source'),
+        Feedback.rating,
+        Feedback.comment,
+        Feedback.semester,
+        Feedback.timestamp
+    ).join(User, Feedback.faculty_id == User.id).order_by(Feedback.faculty_id, Feedback.id)
+
+# Exportable datasets: query builder and Parquet column types
+DATASETS = {
+    'publications': (_publications_query, {
+        'faculty_username': 'string', 'faculty_name': 'string', 'title': 'string',
+        'journal': 'string', 'year': 'int64', 'doi': 'string'
+    }),
+    'experiences': (_experiences_query, {
+        'faculty_username': 'string', 'faculty_name': 'string', 'institution': 'string',
+        'role': 'string', 'duration': 'string', 'description': 'string'
+    }),
+    'feedback': (_feedback_query, {
+        'faculty_username': 'string', 'faculty_name': 'string', 'source': 'string',
+        'rating': 'float64', 'comment': 'string', 'semester': 'string', 'timestamp': 'timestamp[us]'
+    }),
+}
+
+def stream_dataset(dataset, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield a dataset's rows in chunks, fetched through a server-side cursor"""
+    build_query, _ = DATASETS[dataset]
+    with session_scope() as session:
+        result = session.execute(build_query().execution_options(yield_per=chunk_size))
+        for chunk in result.partitions():
+            yield chunk
+
+def _columns(dataset):
+    """Get the column names of a dataset"""
+    return list(DATASETS[dataset][1])
+
+def _write_csv(output, dataset, chunk_size):
+    """Write one dataset to a binary stream as UTF-8 CSV"""
+    text = io.TextIOWrapper(output, encoding='utf-8', newline='')
+    writer = csv.writer(text)
+    writer.writerow(_columns(dataset))
+    for chunk in stream_dataset(dataset, chunk_size):
+        writer.writerows(chunk)
+    text.flush()
+    text.detach()
+
+def _write_parquet(output, dataset, chunk_size):
+    """Write one dataset to a binary stream as Parquet, one row group per chunk"""
+    if pyarrow is None:
+        raise RuntimeError("Parquet export requires the pyarrow package.")
+    
+    schema = pyarrow.schema([
+        (column, pyarrow.type_for_alias(type_name))
+        for column, type_name in DATASETS[dataset][1].items()
+    ])
+    with pyarrow.parquet.ParquetWriter(output, schema) as writer:
+        for chunk in stream_dataset(dataset, chunk_size):
+            columns = list(zip(*chunk))
+            writer.write_table(pyarrow.Table.from_arrays(
+                [pyarrow.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema
+            ))
+
+def _write_xlsx(output, datasets, chunk_size):
+    """Write datasets to a binary stream as an XLSX workbook with one sheet each"""
+    if openpyxl is None:
+        raise RuntimeError("XLSX export requires the openpyxl package.")
+    
+    # Write-only mode streams rows to disk instead of building the sheet in memory
+    workbook = openpyxl.Workbook(write_only=True)
+    for dataset in datasets:
+        sheet = workbook.create_sheet(title=dataset.title())
+        sheet.append(_columns(dataset))
+        for chunk in stream_dataset(dataset, chunk_size):
+            for row in chunk:
+                sheet.append(list(row))
+    workbook.save(output)
+
+def write_export(output, file_format, datasets, chunk_size=EXPORT_CHUNK_SIZE):
+    """Write the department-wide appraisal export to a binary stream
+    
+    CSV and Parquet take exactly one dataset, XLSX writes one sheet per dataset.
+    """
+    unknown = [dataset for dataset in datasets if dataset not in DATASETS]
+    if unknown:
+        raise ValueError(f"Unknown dataset {unknown[0]!r}.")
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {file_format!r}.")
+    if file_format in SINGLE_DATASET_FORMATS and len(datasets) != 1:
+        raise ValueError(f"{file_format.upper()} exports hold exactly one dataset.")
+    
+    if file_format == 'csv':
+        _write_csv(output, datasets[0], chunk_size)
+    elif file_format == 'parquet':
+        _write_parquet(output, datasets[0], chunk_size)
+    else:
+        _write_xlsx(output, datasets, chunk_size)
@@ -1,74 +1,120 @@
 import streamlit as st
-from db_setup import get_db_session, User
+from db_setup import session_scope, retry_on_lock, User
+from cache import user_directory, department_overview
+from passwords import PasswordHasherBusy, password_hasher
 
 def is_authenticated():
     """Check if user is authenticated"""
     return st.session_state.get('authenticated', False)
 
+def _identity(user):
+    """Build the identity kept in session state for an authenticated user"""
+    return {
+        'id': user.id,
+        'username': user.username,
+        'name': user.name,
+        'role': user.role
+    }
+
 def get_current_user():
     """Get current authenticated user"""
     if not is_authenticated():
         return None
     
-    session = get_db_session()
-    username = st.session_state.username
-    user = session.query(User).filter(User.username == username).first()
-    
-    if not user:
-        session.close()
-        return None
-    
-    result = {
-        'username': user.username,
-        'name': user.name,
-        'role': user.role
-    }
+    # Served from session state, stored once at login
+    if st.session_state.get('current_user') is None:
+        refresh_current_user()
     
-    session.close()
-    return result
+    return st.session_state.get('current_user')
+
+def refresh_current_user():
+    """Reload the current user's identity, e.g. after a profile change"""
+    with session_scope() as session:
+        username = st.session_state.username
+        user = session.query(User).filter(User.username == username).first()
+        
+        st.session_state.current_user = _identity(user) if user else None
+        return st.session_state.current_user
 
 def authenticate_user(username, password, role):
-    """Authenticate a user with username, password and role"""
-    session = get_db_session()
-    user = session.query(User).filter(User.username == username).first()
-    
-    if user and user.password == password and user.role == role:
-        st.session_state.authenticated = True
-        st.session_state.username = username
-        st.session_state.user_role = role
-        session.close()
-        return True
+    """Authenticate a user with username, password and role
     
-    session.close()
-    return False
-
-def register_user(username, password, name, role):
-    """Register a new user"""
-    session = get_db_session()
+    Hashes are verified in the password hasher's thread pool, which caps the CPU
+    logins take but does not free the rerun, it waits for the result. The pool
+    raises PasswordHasherBusy when too many logins are already waiting.
+    """
+    with session_scope() as session:
+        # Served by the (username, role) index
+        user = session.query(
+            User.id, User.username, User.name, User.role, User.password
+        ).filter(User.username == username, User.role == role).first()
+        
+        # End the read transaction and return the connection to the pool before
+        # hashing, the rerun's shared session would otherwise hold both meanwhile
+        session.commit()
     
-    # Check if username already exists
-    existing_user = session.query(User).filter(User.username == username).first()
-    if existing_user:
-        session.close()
+    if user is None:
+        password_hasher.verify_unknown_user(password)
         return False
     
-    # Create new user
-    new_user = User(
-        username=username,
-        password=password,
-        name=name,
-        role=role
-    )
+    matches, needs_rehash = password_hasher.verify(password, user.password)
+    if not matches:
+        return False
     
-    session.add(new_user)
-    session.commit()
-    session.close()
+    # Legacy plaintext and outdated hashes are replaced on the first successful login,
+    # or a later one when the hashing pool is too busy to take the extra work now
+    if needs_rehash:
+        try:
+            _rehash_password(user.id, user.password, password)
+        except PasswordHasherBusy:
+            pass
     
+    st.session_state.authenticated = True
+    st.session_state.username = username
+    st.session_state.user_role = role
+    st.session_state.current_user = _identity(user)
     return True
 
+@retry_on_lock
+def _rehash_password(user_id, stored, password):
+    """Store a fresh hash of a verified password, unless another login already replaced it"""
+    new_hash = password_hasher.hash(password)
+    with session_scope() as session:
+        session.query(User).filter(User.id == user_id, User.password == stored).update(
+            {User.password: new_hash}, synchronize_session=False
+        )
+        session.commit()
+
+@retry_on_lock
+def register_user(username, password, name, role):
+    """Register a new user"""
+    with session_scope() as session:
+        # Check if username already exists
+        existing_user = session.query(User).filter(User.username == username).first()
+        if existing_user:
+            return False
+        
+        # Create new user
+        new_user = User(
+            username=username,
+            password=password_hasher.hash(password),
+            name=name,
+            role=role
+        )
+        
+        session.add(new_user)
+        session.commit()
+        
+        # The new user must be visible to directory lookups right away
+        user_directory.invalidate()
+        department_overview.invalidate()
+        
+        return True
+
 def logout():
     """Log out the current user"""
     st.session_state.authenticated = False
     st.session_state.username = None
     st.session_state.user_role = None
+    st.session_state.current_user = None
     st.session_state.current_menu = "Login"
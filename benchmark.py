@@ -0,0 +1,661 @@
+"""Benchmarks for the Faculty Appraisal System database layer.
+
+Run with `python benchmark.py <workload> --help` to see the options for each workload.
+"""
+import os
+import csv
+import json
+import math
+import time
+import random
+import inspect
+import argparse
+import tempfile
+import threading
+
+# Workloads that go through data_manager use the application engine, so point
+# it at a scratch database before db_setup creates it
+SCRATCH_DIR = tempfile.mkdtemp(prefix="appraisal-benchmark-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(SCRATCH_DIR, 'benchmark.db')}"
+
+import streamlit as st
+from sqlalchemy import event, func, insert
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from db_setup import (
+    Base, User, Publication, Experience, Feedback, engine, create_sqlite_engine, is_lock_error,
+    session_scope, rebuild_feedback_rollups
+)
+import auth
+import search
+import passwords
+import data_manager
+from data_manager import add_feedback
+from cache import user_directory, department_overview, rating_trends
+from feedback_ingest import INGEST_COLUMNS, ingest_feedback_file
+from passwords import PasswordHasher, PasswordHasherBusy, hash_password
+
+# Engine profiles compared by the mixed workload
+ENGINE_PROFILES = {
+    'default': {},
+    'tuned': None,  # the configured SQLITE_PRAGMAS profile
+}
+
+def _seed_mixed_database(bind, faculty_count):
+    """Create the schema and a set of faculty and deans to write feedback against"""
+    Base.metadata.create_all(bind)
+    Session = sessionmaker(bind=bind)
+    session = Session()
+    session.add_all(
+        User(username=f"faculty{i}", password="x", name=f"Faculty {i}", role="faculty")
+        for i in range(faculty_count)
+    )
+    session.add(User(username="dean", password="x", name="Dean", role="dean"))
+    session.commit()
+    dean_id = session.query(User.id).filter(User.username == "dean").scalar()
+    faculty_ids = [user_id for (user_id,) in session.query(User.id).filter(User.role == "faculty")]
+    session.close()
+    return dean_id, faculty_ids
+
+def run_mixed(profile, readers, writers, seconds, faculty_count):
+    """Run concurrent summary reads and feedback writes against one engine profile"""
+    path = os.path.join(tempfile.mkdtemp(), "mixed.db")
+    bind = create_sqlite_engine(path, pragmas=ENGINE_PROFILES[profile])
+    dean_id, faculty_ids = _seed_mixed_database(bind, faculty_count)
+    Session = sessionmaker(bind=bind)
+    
+    counts = {'reads': 0, 'writes': 0, 'lock_errors': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+    
+    def reader():
+        session = Session()
+        while time.perf_counter() < deadline:
+            session.query(
+                func.avg(Feedback.rating), func.count(Feedback.id)
+            ).filter(Feedback.faculty_id == random.choice(faculty_ids)).one()
+            session.rollback()
+            with lock:
+                counts['reads'] += 1
+        session.close()
+    
+    def writer(index):
+        session = Session()
+        written = 0
+        while time.perf_counter() < deadline:
+            # A semester per write keeps clear of the one-dean-rating-per-semester index
+            written += 1
+            session.add(Feedback(
+                faculty_id=random.choice(faculty_ids),
+                dean_id=dean_id,
+                rating=random.randint(1, 5),
+                semester=f"bench-{index}-{written}"
+            ))
+            try:
+                session.commit()
+                key = 'writes'
+            except OperationalError as error:
+                if not is_lock_error(error):
+                    raise
+                session.rollback()
+                key = 'lock_errors'
+            with lock:
+                counts[key] += 1
+        session.close()
+    
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer, args=(index,)) for index in range(writers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    bind.dispose()
+    
+    return {
+        'profile': profile,
+        'seconds': round(elapsed, 2),
+        'reads_per_second': round(counts['reads'] / elapsed, 1),
+        'writes_per_second': round(counts['writes'] / elapsed, 1),
+        'lock_errors': counts['lock_errors']
+    }
+
+def _seed_users(role, count, prefix, password="x"):
+    """Bulk insert users for a workload and return their usernames"""
+    usernames = [f"{prefix}{i}" for i in range(count)]
+    with session_scope() as session:
+        session.execute(insert(User), [
+            {'username': username, 'password': password, 'name': username.title(), 'role': role}
+            for username in usernames
+        ])
+        session.commit()
+    return usernames
+
+def run_ingest(rows, faculty_count, student_count, chunk_size, baseline_rows):
+    """Time the batched ingestion pipeline, and add_feedback row by row as a baseline"""
+    run_id = random.randrange(10 ** 6)
+    faculty = _seed_users('faculty', faculty_count, f"ingest{run_id}_faculty")
+    students = _seed_users('student', student_count, f"ingest{run_id}_student")
+    
+    # A survey file of random ratings, including some duplicates to reject
+    survey_path = os.path.join(SCRATCH_DIR, f"survey{run_id}.csv")
+    with open(survey_path, 'w', newline='') as survey:
+        writer = csv.writer(survey)
+        writer.writerow(INGEST_COLUMNS)
+        for _ in range(rows):
+            writer.writerow([
+                random.choice(students), 'student', random.choice(faculty),
+                random.randint(1, 5), "Paper survey", "2024-1"
+            ])
+    
+    with open(survey_path, newline='') as survey, open(os.devnull, 'w') as rejects:
+        report = ingest_feedback_file(survey, rejects, chunk_size=chunk_size)
+    
+    started = time.perf_counter()
+    for _ in range(baseline_rows):
+        add_feedback(random.choice(students), 'student', random.choice(faculty),
+                     random.randint(1, 5), "Paper survey", "2024-2")
+    baseline_seconds = time.perf_counter() - started
+    
+    return {
+        'rows': report['rows'],
+        'inserted': report['inserted'],
+        'rejected': report['rejected'],
+        'seconds': report['seconds'],
+        'rows_per_second': report['rows_per_second'],
+        'add_feedback_rows_per_second': round(baseline_rows / baseline_seconds, 1) if baseline_rows else None
+    }
+
+def run_submissions(threads, submissions, faculty_count, student_count):
+    """Time concurrent add_feedback calls writing directly and through the background writer"""
+    run_id = random.randrange(10 ** 6)
+    faculty = _seed_users('faculty', faculty_count, f"submit{run_id}_faculty")
+    students = _seed_users('student', student_count, f"submit{run_id}_student")
+    user_directory.invalidate()
+    
+    results = []
+    for mode, semester in (('direct', "2024-1"), ('writer', "2024-2")):
+        data_manager.FEEDBACK_WRITER_ENABLED = mode == 'writer'
+        counts = {'submitted': 0, 'duplicate': 0}
+        lock = threading.Lock()
+        attempts = iter(range(submissions))
+        
+        def submit():
+            for _ in attempts:
+                success, _ = add_feedback(random.choice(students), 'student', random.choice(faculty),
+                                          random.randint(1, 5), "Benchmark", semester)
+                with lock:
+                    counts['submitted' if success else 'duplicate'] += 1
+        
+        pool = [threading.Thread(target=submit) for _ in range(threads)]
+        started = time.perf_counter()
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        
+        results.append(dict(
+            counts,
+            mode=mode,
+            seconds=round(elapsed, 2),
+            submissions_per_second=round(submissions / elapsed, 1)
+        ))
+    
+    data_manager.FEEDBACK_WRITER_ENABLED = False
+    results[-1]['writer'] = data_manager.feedback_writer.stats()
+    return results
+
+def run_login(users, threads, logins, scheme, cost, workers, legacy):
+    """Time concurrent logins through authenticate_user at a given hash cost, in logins per second
+    
+    With legacy set the users start with plaintext passwords, so each user's first
+    login also pays for upgrading the row to a hash.
+    """
+    st.session_state = SuiteSessionState()
+    passwords.PASSWORD_SCHEME = scheme
+    if scheme == 'scrypt':
+        passwords.SCRYPT_N = cost
+    else:
+        passwords.PBKDF2_ITERATIONS = cost
+    auth.password_hasher = PasswordHasher(workers=workers)
+    
+    started = time.perf_counter()
+    password = "x" if legacy else hash_password("x")
+    hash_ms = (time.perf_counter() - started) * 1000
+    run_id = random.randrange(10 ** 6)
+    usernames = _seed_users('faculty', users, f"login{run_id}_faculty", password)
+    
+    latencies, failures = [], {'rejected': 0, 'busy': 0}
+    lock = threading.Lock()
+    attempts = iter(range(logins))
+    
+    def login():
+        for attempt in attempts:
+            began = time.perf_counter()
+            try:
+                accepted = auth.authenticate_user(usernames[attempt % users], "x", 'faculty')
+            except PasswordHasherBusy:
+                accepted = None
+            elapsed = (time.perf_counter() - began) * 1000
+            with lock:
+                if accepted:
+                    latencies.append(elapsed)
+                else:
+                    failures['rejected' if accepted is False else 'busy'] += 1
+    
+    workers_started = time.perf_counter()
+    pool = [threading.Thread(target=login) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - workers_started
+    
+    with session_scope() as session:
+        hashed = session.query(func.count(User.id)).filter(
+            User.username.like(f"login{run_id}_faculty%"), User.password.like(f"{scheme}$%")
+        ).scalar()
+    
+    latencies.sort()
+    return {
+        'scheme': scheme,
+        'cost': cost,
+        'hash_ms': None if legacy else round(hash_ms, 1),
+        'workers': workers,
+        'threads': threads,
+        'logins': len(latencies),
+        'rejected': failures['rejected'],
+        'busy': failures['busy'],
+        'hashed_users': hashed,
+        'seconds': round(elapsed, 2),
+        'logins_per_second': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(_percentile(latencies, 0.50), 1) if latencies else None,
+        'p99_ms': round(_percentile(latencies, 0.99), 1) if latencies else None
+    }
+
+# Semesters the synthetic feedback is spread over
+SUITE_SEMESTERS = ['2022-1', '2022-2', '2023-1', '2023-2', '2024-1']
+
+# Semester the suite's own feedback writes go to
+SUITE_WRITE_SEMESTER = '2025-1'
+
+# Rows per executemany batch while generating synthetic data
+GENERATE_BATCH_SIZE = 10000
+
+# Modules whose public functions the suite times
+SUITE_MODULES = (data_manager, auth, search)
+
+# Medians below this are timer noise and never reported as regressions
+REGRESSION_FLOOR_MS = 0.05
+
+class SuiteSessionState(dict):
+    """Attribute-style session state for the suite, since st.session_state only works under `streamlit run`"""
+    
+    def __getattr__(self, key):
+        return self.get(key)
+    
+    def __setattr__(self, key, value):
+        self[key] = value
+
+def _insert_batches(model, rows):
+    """Bulk insert generated rows in executemany batches"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= GENERATE_BATCH_SIZE:
+            with session_scope() as session:
+                session.execute(insert(model), batch)
+                session.commit()
+            batch = []
+    if batch:
+        with session_scope() as session:
+            session.execute(insert(model), batch)
+            session.commit()
+
+def _user_ids(role):
+    """Get (id, username) of every user with a role"""
+    with session_scope() as session:
+        return session.query(User.id, User.username).filter(User.role == role).order_by(User.id).all()
+
+def generate_dataset(faculty_count, student_count, feedback_rows, publications_per_faculty, experiences_per_faculty, seed):
+    """Fill the scratch database with synthetic users, records and feedback"""
+    if feedback_rows > faculty_count * student_count:
+        raise ValueError("feedback rows cannot exceed faculty x students, one rating per pair.")
+    
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    # One shared hash of "x", hashing per user would dominate generation time
+    password = hash_password("x")
+    _seed_users('faculty', faculty_count, "suite_faculty", password)
+    _seed_users('student', student_count, "suite_student", password)
+    _seed_users('dean', 1, "suite_dean", password)
+    faculty = [user_id for user_id, _ in _user_ids('faculty')]
+    students = [user_id for user_id, _ in _user_ids('student')]
+    dean_id = _user_ids('dean')[0][0]
+    
+    _insert_batches(Publication, (
+        {'faculty_id': faculty_id, 'title': f"Synthetic Study {faculty_id}-{i}", 'journal': f"Journal {i % 40}",
+         'year': rng.randint(1990, 2024), 'doi': f"10.5555/suite.{faculty_id}.{i}"}
+        for faculty_id in faculty for i in range(publications_per_faculty)
+    ))
+    _insert_batches(Experience, (
+        {'faculty_id': faculty_id, 'institution': f"University {i}", 'role': "Lecturer",
+         'duration': f"{2000 + i}-{2001 + i}", 'description': "Synthetic experience"}
+        for faculty_id in faculty for i in range(experiences_per_faculty)
+    ))
+    
+    # Student k-th ratings go to distinct faculty, so (student, faculty, semester) stays unique
+    _insert_batches(Feedback, (
+        {'faculty_id': faculty[(k % student_count * 7919 + k // student_count) % faculty_count],
+         'student_id': students[k % student_count], 'rating': rng.randint(1, 5),
+         'comment': "Synthetic feedback", 'semester': SUITE_SEMESTERS[k // student_count % len(SUITE_SEMESTERS)]}
+        for k in range(feedback_rows)
+    ))
+    _insert_batches(Feedback, (
+        {'faculty_id': faculty_id, 'dean_id': dean_id, 'rating': rng.randint(1, 5), 'semester': semester}
+        for faculty_id in faculty for semester in SUITE_SEMESTERS
+    ))
+    
+    with engine.begin() as connection:
+        rebuild_feedback_rollups(connection)
+    user_directory.invalidate()
+    department_overview.invalidate()
+    
+    return round(time.perf_counter() - started, 1)
+
+def _suite_cases(state):
+    """Map each benchmarked function name to a factory that prepares one call with random arguments
+    
+    Factories run untimed and return the zero-argument callable that is timed.
+    """
+    faculty, students, publications, experiences = state['faculty'], state['students'], state['publications'], state['experiences']
+    users = faculty + students
+    counter = iter(range(10 ** 9))
+    
+    def faculty_call(fn, **kwargs):
+        return lambda rng: (lambda username=rng.choice(faculty)[1]: fn(username, **kwargs))
+    
+    def logged_in(rng):
+        _, username = rng.choice(faculty)
+        st.session_state.update(authenticated=True, username=username, user_role='faculty', current_user=None)
+    
+    def add_publication(rng):
+        faculty_id, username = rng.choice(faculty)
+        return lambda: publications.append(data_manager.add_publication(
+            username, "Benchmark Study", "Journal", 2024, None, faculty_id=faculty_id
+        ))
+    
+    def add_experience(rng):
+        faculty_id, username = rng.choice(faculty)
+        return lambda: experiences.append(data_manager.add_experience(
+            username, "University", "Lecturer", "2024", "Benchmark", faculty_id=faculty_id
+        ))
+    
+    def add_feedback(rng):
+        student_id, student = rng.choice(students)
+        return lambda: data_manager.add_feedback(
+            student, 'student', rng.choice(faculty)[1], rng.randint(1, 5), "Benchmark", SUITE_WRITE_SEMESTER, from_user_id=student_id
+        )
+    
+    def upsert_dean_feedback(rng):
+        dean_id, dean = state['dean']
+        faculty_id, username = rng.choice(faculty)
+        return lambda: data_manager.upsert_dean_feedback(
+            dean, username, rng.randint(1, 5), "Benchmark", SUITE_WRITE_SEMESTER, dean_id=dean_id, faculty_id=faculty_id
+        )
+    
+    def get_dean_feedback(rng):
+        dean_id, dean = state['dean']
+        faculty_id, username = rng.choice(faculty)
+        return lambda: data_manager.get_dean_feedback(
+            dean, username, rng.choice(SUITE_SEMESTERS), dean_id=dean_id, faculty_id=faculty_id
+        )
+    
+    def apply_rollup_deltas(rng):
+        key = (rng.choice(faculty)[0], SUITE_WRITE_SEMESTER, 'student')
+        def call():
+            with session_scope() as session:
+                data_manager.apply_feedback_rollup_deltas(session, {key: data_manager.feedback_rollup_delta(4)})
+                session.rollback()
+        return call
+    
+    def rating_trend_uncached(rng):
+        faculty_id, username = rng.choice(faculty)
+        rating_trends.invalidate(faculty_id)
+        return lambda: data_manager.get_rating_trend(username, faculty_id=faculty_id)
+    
+    def department_overview_uncached(rng):
+        department_overview.invalidate()
+        return data_manager.get_department_overview
+    
+    def authenticate(rng):
+        _, username = rng.choice(faculty)
+        return lambda: auth.authenticate_user(username, "x", 'faculty')
+    
+    def register(rng):
+        username = f"suite_registered{rng.randrange(10 ** 9)}_{next(counter)}"
+        return lambda: auth.register_user(username, "x", username.title(), 'student')
+    
+    def with_login(fn):
+        def prepare(rng):
+            logged_in(rng)
+            return fn
+        return prepare
+    
+    return {
+        'initialize_data': lambda rng: data_manager.initialize_data,
+        'get_current_semester': lambda rng: data_manager.get_current_semester,
+        'get_user_by_username': lambda rng: (lambda username=rng.choice(users)[1]: data_manager.get_user_by_username(username)),
+        'get_user_by_id': lambda rng: (lambda user_id=rng.choice(users)[0]: data_manager.get_user_by_id(user_id)),
+        'resolve_user_id': faculty_call(data_manager.resolve_user_id),
+        'get_all_faculty': lambda rng: data_manager.get_all_faculty,
+        'search_faculty': lambda rng: (lambda query=rng.choice(faculty)[1][:-1]: data_manager.search_faculty(query)),
+        'get_faculty_publications': faculty_call(data_manager.get_faculty_publications),
+        'get_faculty_publications_page': faculty_call(data_manager.get_faculty_publications_page),
+        'get_faculty_experiences': faculty_call(data_manager.get_faculty_experiences),
+        'get_faculty_experiences_page': faculty_call(data_manager.get_faculty_experiences_page),
+        'get_faculty_feedback': faculty_call(data_manager.get_faculty_feedback),
+        'get_faculty_feedback_page': faculty_call(data_manager.get_faculty_feedback_page),
+        'get_faculty_record_counts': faculty_call(data_manager.get_faculty_record_counts),
+        'get_feedback_summary': faculty_call(data_manager.get_feedback_summary),
+        'get_rating_trend': rating_trend_uncached,
+        'get_faculty_profile': faculty_call(data_manager.get_faculty_profile),
+        'get_faculty_profile_page': faculty_call(data_manager.get_faculty_profile, limit=data_manager.PAGE_SIZE),
+        'get_department_overview': department_overview_uncached,
+        'has_given_feedback': lambda rng: (lambda student=rng.choice(students)[1], username=rng.choice(faculty)[1]:
+                                           data_manager.has_given_feedback(student, username, SUITE_SEMESTERS[-1])),
+        'get_feedback_status_for_student': lambda rng: (lambda student=rng.choice(students)[1]:
+                                                        data_manager.get_feedback_status_for_student(student, SUITE_SEMESTERS[-1])),
+        'feedback_rollup_delta': lambda rng: (lambda rating=rng.randint(1, 5): data_manager.feedback_rollup_delta(rating)),
+        'apply_feedback_rollup_deltas': apply_rollup_deltas,
+        'add_publication': add_publication,
+        'update_publication': lambda rng: (lambda pub_id=rng.choice(publications):
+                                           data_manager.update_publication(pub_id, "Updated Study", "Journal", 2024, None)),
+        'delete_publication': lambda rng: (lambda pub_id=publications.pop(rng.randrange(len(publications))):
+                                           data_manager.delete_publication(pub_id)),
+        'add_experience': add_experience,
+        'update_experience': lambda rng: (lambda exp_id=rng.choice(experiences):
+                                          data_manager.update_experience(exp_id, "University", "Professor", "2024", "Updated")),
+        'delete_experience': lambda rng: (lambda exp_id=experiences.pop(rng.randrange(len(experiences))):
+                                          data_manager.delete_experience(exp_id)),
+        'add_feedback': add_feedback,
+        'upsert_dean_feedback': upsert_dean_feedback,
+        'get_dean_feedback': get_dean_feedback,
+        'search_terms': lambda rng: (lambda: search.search_terms("synthetic study of journals")),
+        'search_publications': lambda rng: (lambda page=rng.randrange(5): search.search_publications(
+            f"journal {rng.randrange(40)}", offset=page * search.SEARCH_PAGE_SIZE)),
+        'search_feedback_comments': lambda rng: (lambda: search.search_feedback_comments("synthetic feed")),
+        'is_authenticated': with_login(auth.is_authenticated),
+        'get_current_user': with_login(auth.get_current_user),
+        'refresh_current_user': with_login(auth.refresh_current_user),
+        'authenticate_user': authenticate,
+        'register_user': register,
+        'logout': with_login(auth.logout),
+    }
+
+def _percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def _public_functions(module):
+    """Get the names of the public functions defined in a module"""
+    return sorted(
+        name for name, value in vars(module).items()
+        if inspect.isfunction(value) and value.__module__ == module.__name__ and not name.startswith('_')
+    )
+
+def _compare(results, baseline_path, threshold):
+    """List the functions whose median latency grew by more than threshold against a baseline run"""
+    with open(baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)['functions']
+    
+    regressions = []
+    for name, timing in results.items():
+        previous = baseline.get(name)
+        if previous and previous['p50_ms'] >= REGRESSION_FLOOR_MS and timing['p50_ms'] / previous['p50_ms'] > threshold:
+            regressions.append({
+                'function': name,
+                'baseline_p50_ms': previous['p50_ms'],
+                'p50_ms': timing['p50_ms'],
+                'ratio': round(timing['p50_ms'] / previous['p50_ms'], 2)
+            })
+    return regressions
+
+def run_suite(faculty_count, student_count, feedback_rows, publications_per_faculty, experiences_per_faculty,
+              iterations, seed, baseline_path=None, threshold=1.25):
+    """Generate a synthetic database and time every public data_manager, auth and search function against it"""
+    st.session_state = SuiteSessionState()
+    generation_seconds = generate_dataset(
+        faculty_count, student_count, feedback_rows, publications_per_faculty, experiences_per_faculty, seed
+    )
+    
+    with session_scope() as session:
+        state = {
+            'faculty': _user_ids('faculty'),
+            'students': _user_ids('student'),
+            'dean': _user_ids('dean')[0],
+            'publications': [pub_id for (pub_id,) in session.query(Publication.id)],
+            'experiences': [exp_id for (exp_id,) in session.query(Experience.id)]
+        }
+    
+    # Every statement the application engine executes is counted against the running call
+    statements = [0]
+    def count_statement(*args):
+        statements[0] += 1
+    event.listen(engine, 'before_cursor_execute', count_statement)
+    
+    rng = random.Random(seed)
+    results = {}
+    try:
+        for name, prepare in _suite_cases(state).items():
+            latencies = []
+            statement_total = 0
+            for _ in range(iterations):
+                call = prepare(rng)
+                statements[0] = 0
+                started = time.perf_counter()
+                call()
+                latencies.append((time.perf_counter() - started) * 1000)
+                statement_total += statements[0]
+            
+            latencies.sort()
+            results[name] = {
+                'calls': iterations,
+                'p50_ms': round(_percentile(latencies, 0.50), 3),
+                'p90_ms': round(_percentile(latencies, 0.90), 3),
+                'p99_ms': round(_percentile(latencies, 0.99), 3),
+                'max_ms': round(latencies[-1], 3),
+                'mean_ms': round(sum(latencies) / iterations, 3),
+                'statements_per_call': round(statement_total / iterations, 2)
+            }
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_statement)
+    
+    public = {name for module in SUITE_MODULES for name in _public_functions(module)}
+    report = {
+        'scale': {
+            'faculty': faculty_count,
+            'students': student_count,
+            'feedback_rows': feedback_rows,
+            'publications_per_faculty': publications_per_faculty,
+            'experiences_per_faculty': experiences_per_faculty
+        },
+        'seed': seed,
+        'generation_seconds': generation_seconds,
+        'functions': results,
+        'not_timed': sorted(public - set(results))
+    }
+    if baseline_path:
+        report['regressions'] = _compare(results, baseline_path, threshold)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    workloads = parser.add_subparsers(dest='workload', required=True)
+    
+    mixed = workloads.add_parser('mixed', help="concurrent reads and writes, default vs tuned engine profile")
+    mixed.add_argument('--readers', type=int, default=4)
+    mixed.add_argument('--writers', type=int, default=4)
+    mixed.add_argument('--seconds', type=float, default=5)
+    mixed.add_argument('--faculty', type=int, default=100)
+    
+    ingest = workloads.add_parser('ingest', help="batched feedback ingestion vs add_feedback, in rows per second")
+    ingest.add_argument('--rows', type=int, default=50000)
+    ingest.add_argument('--faculty', type=int, default=300)
+    ingest.add_argument('--students', type=int, default=5000)
+    ingest.add_argument('--chunk-size', type=int, default=5000)
+    ingest.add_argument('--baseline-rows', type=int, default=500)
+    
+    suite = workloads.add_parser('suite', help="latency percentiles and SQL counts of every data_manager, auth and search function on synthetic data")
+    suite.add_argument('--faculty', type=int, default=500)
+    suite.add_argument('--students', type=int, default=5000)
+    suite.add_argument('--feedback', type=int, default=100000)
+    suite.add_argument('--publications', type=int, default=10, help="publications per faculty member")
+    suite.add_argument('--experiences', type=int, default=3, help="experiences per faculty member")
+    suite.add_argument('--iterations', type=int, default=50, help="timed calls per function")
+    suite.add_argument('--seed', type=int, default=42)
+    suite.add_argument('--output', help="also write the results to this JSON file")
+    suite.add_argument('--baseline', help="results JSON of an earlier run to compare against")
+    suite.add_argument('--threshold', type=float, default=1.25, help="median latency ratio reported as a regression")
+    
+    submissions = workloads.add_parser('submissions', help="concurrent add_feedback calls, direct vs background writer")
+    submissions.add_argument('--threads', type=int, default=32, help="concurrent submitters, like Streamlit sessions")
+    submissions.add_argument('--submissions', type=int, default=5000)
+    submissions.add_argument('--faculty', type=int, default=300)
+    submissions.add_argument('--students', type=int, default=5000)
+    
+    login = workloads.add_parser('login', help="concurrent logins per second at a given password hash cost")
+    login.add_argument('--users', type=int, default=1000)
+    login.add_argument('--threads', type=int, default=16, help="concurrent login attempts, like Streamlit sessions")
+    login.add_argument('--logins', type=int, default=500)
+    login.add_argument('--scheme', choices=['scrypt', 'pbkdf2_sha256'], default=passwords.PASSWORD_SCHEME)
+    login.add_argument('--cost', type=int, help="scrypt N or PBKDF2 iterations, defaults to the configured cost")
+    login.add_argument('--workers', type=int, default=passwords.PASSWORD_HASH_WORKERS, help="password hashing threads")
+    login.add_argument('--legacy', action='store_true', help="start from plaintext passwords upgraded at first login")
+    
+    args = parser.parse_args()
+    if args.workload == 'mixed':
+        results = [
+            run_mixed(profile, args.readers, args.writers, args.seconds, args.faculty)
+            for profile in ENGINE_PROFILES
+        ]
+    elif args.workload == 'ingest':
+        results = run_ingest(args.rows, args.faculty, args.students, args.chunk_size, args.baseline_rows)
+    elif args.workload == 'submissions':
+        results = run_submissions(args.threads, args.submissions, args.faculty, args.students)
+    elif args.workload == 'login':
+        cost = args.cost or (passwords.SCRYPT_N if args.scheme == 'scrypt' else passwords.PBKDF2_ITERATIONS)
+        results = run_login(args.users, args.threads, args.logins, args.scheme, cost, args.workers, args.legacy)
+    elif args.workload == 'suite':
+        results = run_suite(args.faculty, args.students, args.feedback, args.publications, args.experiences,
+                            args.iterations, args.seed, args.baseline, args.threshold)
+        if args.output:
+            with open(args.output, 'w') as output:
+                json.dump(results, output, indent=2)
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
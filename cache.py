@@ -0,0 +1,213 @@
+import time
+import threading
+from collections import OrderedDict, namedtuple
+from db_setup import session_scope, User
+
+# Read-only view of a user row, safe to share between threads and sessions
+UserRecord = namedtuple('UserRecord', ['id', 'username', 'name', 'role'])
+
+# Seconds a directory snapshot is served before it is reloaded. Writes made by
+# this process invalidate it immediately, the TTL covers other processes.
+USER_DIRECTORY_TTL = 300
+
+class UserDirectory:
+    """Process-wide snapshot of the users table indexed by id, username and role"""
+    
+    def __init__(self, ttl=USER_DIRECTORY_TTL):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._by_id = {}
+        self._by_username = {}
+        self._by_role = {}
+    
+    def _load(self):
+        """Replace the snapshot with the current contents of the users table"""
+        with session_scope() as session:
+            rows = session.query(User.id, User.username, User.name, User.role).order_by(User.id).all()
+        
+        by_id, by_username, by_role = {}, {}, {}
+        for row in rows:
+            record = UserRecord(*row)
+            by_id[record.id] = record
+            by_username[record.username] = record
+            by_role.setdefault(record.role, []).append(record)
+        
+        self._by_id, self._by_username, self._by_role = by_id, by_username, by_role
+        self._loaded_at = time.monotonic()
+    
+    def _ensure_fresh(self):
+        """Count the lookup and reload the snapshot if it is missing or expired"""
+        with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+                self.misses += 1
+                self._load()
+            else:
+                self.hits += 1
+    
+    def get_by_id(self, user_id):
+        """Get a user record by ID"""
+        self._ensure_fresh()
+        return self._by_id.get(user_id)
+    
+    def get_by_username(self, username):
+        """Get a user record by username"""
+        self._ensure_fresh()
+        return self._by_username.get(username)
+    
+    def get_by_role(self, role):
+        """Get all user records with a role, in registration order"""
+        self._ensure_fresh()
+        return list(self._by_role.get(role, []))
+    
+    def invalidate(self):
+        """Drop the snapshot so the next lookup reloads it"""
+        with self._lock:
+            self._loaded_at = None
+    
+    def stats(self):
+        """Get hit/miss counters and snapshot size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0,
+                'users': len(self._by_id),
+                'age_seconds': round(time.monotonic() - self._loaded_at, 1) if self._loaded_at is not None else None
+            }
+
+# Shared by every Streamlit session in this process
+user_directory = UserDirectory()
+
+# Seconds a cached result is served when no write in this process invalidated it
+CACHED_RESULT_TTL = 300
+
+class CachedResult:
+    """Process-wide result of an expensive read, kept until the next write invalidates it"""
+    
+    def __init__(self, ttl=CACHED_RESULT_TTL):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._value = None
+    
+    def get(self, loader):
+        """Get the cached value, calling loader to compute it when missing or expired"""
+        with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+                self.misses += 1
+                self._value = loader()
+                self._loaded_at = time.monotonic()
+            else:
+                self.hits += 1
+            return self._value
+    
+    def invalidate(self):
+        """Drop the cached value so the next read recomputes it"""
+        with self._lock:
+            self._loaded_at = None
+    
+    def stats(self):
+        """Get hit/miss counters and the age of the cached value"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0,
+                'age_seconds': round(time.monotonic() - self._loaded_at, 1) if self._loaded_at is not None else None
+            }
+
+# Department overview rows, invalidated by every write that changes them
+department_overview = CachedResult()
+
+# Keys a CachedResults keeps before evicting the least recently used
+CACHED_RESULTS_MAX_KEYS = 2000
+
+class CachedResults:
+    """Process-wide results of an expensive read per key, e.g. per faculty member, kept until invalidated"""
+    
+    def __init__(self, ttl=CACHED_RESULT_TTL, max_keys=CACHED_RESULTS_MAX_KEYS):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._generation = 0
+    
+    def get(self, key, loader):
+        """Get the cached value for a key, calling loader() to compute it when missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+        
+        # Computed outside the lock so loads for different keys do not wait on each other
+        value = loader()
+        with self._lock:
+            # An invalidation during the load may have made the value stale, serve it but don't keep it
+            if generation != self._generation:
+                return value
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+        return value
+    
+    def invalidate(self, *keys):
+        """Drop the cached values of some keys, or of every key when none are given"""
+        with self._lock:
+            self._generation += 1
+            if not keys:
+                self._entries.clear()
+            for key in keys:
+                self._entries.pop(key, None)
+    
+    def stats(self):
+        """Get hit/miss counters and the number of cached keys"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0,
+                'keys': len(self._entries)
+            }
+
+# Per-semester rating trends by faculty ID, invalidated by feedback writes for that faculty
+rating_trends = CachedResults()
+
+class WriteVersions:
+    """Process-wide counters per key, e.g. per faculty member, that move on every write to its rows
+    
+    Readers compare versions to tell whether data they kept from an earlier rerun is
+    still current. Counters only see writes made by this process.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = {}
+    
+    def get(self, key):
+        """Get the current version of a key"""
+        with self._lock:
+            return self._versions.get(key, 0)
+    
+    def bump(self, *keys):
+        """Move the versions of some keys after their rows changed"""
+        with self._lock:
+            for key in keys:
+                self._versions[key] = self._versions.get(key, 0) + 1
+
+# Versions of each faculty member's publications, experiences and feedback, by faculty ID
+record_versions = WriteVersions()
@@ -0,0 +1,80 @@
+import streamlit as st
+import pandas as pd
+from data_manager import TREND_WINDOW, search_faculty
+
+def get_paged_records(state_key, total, fetch_page, version=None, first_page=None):
+    """Get the records loaded so far for a paginated list, starting with the first page
+    
+    fetch_page(after_id) must return (records, next_after_id) as the data_manager
+    *_page functions do. Loaded records are kept in session state between reruns
+    and reloaded from the first page when the total or the write version changes,
+    so edits that keep the count, like a retitled publication, show up too. A
+    first_page (records, next_after_id) the caller already has is used instead of
+    fetching it again.
+    """
+    page = st.session_state.get(state_key)
+    if page is None or page['total'] != total or page['version'] != version:
+        records, next_after_id = first_page if first_page is not None else fetch_page(None)
+        page = {'records': records, 'next_after_id': next_after_id, 'total': total, 'version': version}
+        st.session_state[state_key] = page
+    return page['records']
+
+def _load_next_page(state_key, fetch_page):
+    """Append the next page of records to a paginated list"""
+    page = st.session_state[state_key]
+    records, next_after_id = fetch_page(page['next_after_id'])
+    page['records'].extend(records)
+    page['next_after_id'] = next_after_id
+
+def render_load_more(state_key, fetch_page, label="Load more"):
+    """Show how many records are loaded and a button that fetches the next page"""
+    page = st.session_state[state_key]
+    st.caption(f"Showing {len(page['records'])} of {page['total']}")
+    if page['next_after_id'] is not None:
+        st.button(label, key=f"{state_key}_load_more", on_click=_load_next_page, args=(state_key, fetch_page))
+
+def reset_paged_records(state_key):
+    """Forget the loaded records so the list reloads from the first page"""
+    st.session_state.pop(state_key, None)
+
+def faculty_picker(label, key):
+    """Pick a faculty member by typing part of their name, searching the database on each change
+    
+    Only the best matches for the current text are sent to the browser. Returns the
+    selected faculty as a dict with id, username and name, or None without a match.
+    """
+    query = st.text_input(label, key=f"{key}_query", placeholder="Start typing a name or username")
+    candidates = search_faculty(query)
+    if not candidates:
+        if query.strip():
+            st.info(f"No faculty member matches \"{query}\".")
+        else:
+            st.warning("No faculty members are registered in the system.")
+        return None
+    
+    index = st.selectbox(
+        "Matching faculty",
+        range(len(candidates)),
+        format_func=lambda i: f"{candidates[i]['name']} ({candidates[i]['username']})",
+        key=f"{key}_choice"
+    )
+    return candidates[index]
+
+def render_rating_trend(trend):
+    """Chart a rating trend from get_rating_trend, with the per-semester statistics below it"""
+    if not trend:
+        st.info("No ratings yet to show a trend.")
+        return
+    
+    semesters = pd.DataFrame(trend).set_index('semester')
+    st.line_chart(semesters[['mean', 'rolling_mean', 'cumulative_mean']].rename(columns={
+        'mean': "Semester mean",
+        'rolling_mean': f"Last {TREND_WINDOW} semesters",
+        'cumulative_mean': "All semesters so far"
+    }))
+    
+    with st.expander("Ratings per semester"):
+        distribution = pd.DataFrame(list(semesters['distribution']), index=semesters.index)
+        distribution.columns = [f"{star}★" for star in distribution.columns]
+        details = semesters[['count', 'mean', 'std']].rename(columns={'count': "Ratings", 'mean': "Mean", 'std': "Std. dev."})
+        st.dataframe(details.join(distribution), use_container_width=True)
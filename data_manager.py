@@ -1,7 +1,40 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-from db_setup import get_db_session, User, Publication, Experience, Feedback
+from sqlalchemy import case, func, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased, joinedload, selectinload
+from db_setup import (
+    session_scope, retry_on_lock, dialect_insert, User, Publication, Experience, Feedback,
+    FeedbackRollup, ROLLUP_STAR_COLUMNS
+)
+from cache import user_directory, department_overview, rating_trends, record_versions
+from feedback_writer import FEEDBACK_WRITER_ENABLED, FeedbackWriter
+
+# Star ratings offered by the feedback forms
+RATING_SCALE = (1, 2, 3, 4, 5)
+
+# Rows per page for paginated lists
+PAGE_SIZE = 20
+
+# Matches returned per faculty picker search
+FACULTY_SEARCH_LIMIT = 20
+
+# Collections get_faculty_profile can load
+PROFILE_SECTIONS = ('publications', 'experiences', 'feedback')
+
+# add_feedback results shared by the direct and the batched write paths
+FEEDBACK_SUBMITTED = (True, "Feedback submitted successfully.")
+FEEDBACK_DUPLICATE = (False, "You have already submitted feedback for this faculty this semester.")
+FEEDBACK_UPDATED = (True, "Feedback updated successfully.")
+FEEDBACK_BUSY = (False, "Many submissions are being saved right now, please try again in a moment.")
+FEEDBACK_ROLE_REJECTED = (False, "Only students and deans can give feedback.")
+
+# Semesters averaged by the rolling mean of the rating trend
+TREND_WINDOW = 3
+
+# FeedbackRollup columns that accumulate per feedback row
+ROLLUP_TOTAL_COLUMNS = ('rating_sum', 'rating_count') + ROLLUP_STAR_COLUMNS
 
 def initialize_data():
     """Initialize sample data structures if they don't exist"""
@@ -15,338 +48,922 @@ def initialize_data():
 
 def get_user_by_username(username):
     """Get a user by username"""
-    session = get_db_session()
-    user = session.query(User).filter(User.username == username).first()
-    session.close()
-    return user
+    return user_directory.get_by_username(username)
 
 def get_user_by_id(user_id):
     """Get a user by ID"""
-    session = get_db_session()
-    user = session.query(User).filter(User.id == user_id).first()
-    session.close()
-    return user
+    return user_directory.get_by_id(user_id)
 
 def get_all_faculty():
     """Get list of all faculty members"""
-    session = get_db_session()
-    faculty_users = session.query(User).filter(User.role == 'faculty').all()
-    
     faculty = []
-    for user in faculty_users:
+    for user in user_directory.get_by_role('faculty'):
         faculty.append({
             'username': user.username,
             'name': user.name
         })
     
-    session.close()
     return faculty
 
-def get_faculty_publications(faculty_username):
-    """Get publications for a specific faculty member"""
-    session = get_db_session()
-    
-    # Get the faculty user
-    faculty = get_user_by_username(faculty_username)
-    if not faculty:
-        session.close()
-        return []
-    
-    # Get publications
-    publications = session.query(Publication).filter(Publication.faculty_id == faculty.id).all()
-    
-    # Convert to list of dictionaries
-    result = []
-    for pub in publications:
-        result.append({
-            'id': pub.id,
-            'faculty_username': faculty_username,
-            'title': pub.title,
-            'journal': pub.journal,
-            'year': pub.year,
-            'doi': pub.doi
-        })
-    
-    session.close()
-    return result
+def _like_pattern(text, prefix):
+    """Build a LIKE pattern matching text literally, as a prefix or anywhere"""
+    escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"{escaped}%" if prefix else f"%{escaped}%"
 
-def add_publication(faculty_username, title, journal, year, doi):
-    """Add a new publication for a faculty member"""
-    session = get_db_session()
-    
-    # Get the faculty user
-    faculty = get_user_by_username(faculty_username)
-    if not faculty:
-        session.close()
-        return None
+def search_faculty(query, limit=FACULTY_SEARCH_LIMIT):
+    """Find faculty by name or username: name prefixes first, then username prefixes, then matches inside either"""
+    query = (query or '').strip()
+    with session_scope() as session:
+        # SQLite LIKE is already case-insensitive and can range-scan the NOCASE
+        # indexes, ILIKE would wrap the columns in lower() there
+        if session.get_bind().dialect.name == 'sqlite':
+            like = lambda column, pattern: column.like(pattern, escape='\\')
+            order = User.name.collate('NOCASE')
+        else:
+            like = lambda column, pattern: column.ilike(pattern, escape='\\')
+            order = User.name
+        
+        faculty = session.query(User.id, User.username, User.name).filter(User.role == 'faculty')
+        if not query:
+            rows = faculty.order_by(order).limit(limit).all()
+        else:
+            prefix, substring = _like_pattern(query, prefix=True), _like_pattern(query, prefix=False)
+            stages = [
+                like(User.name, prefix),
+                like(User.username, prefix),
+                or_(like(User.name, substring), like(User.username, substring))
+            ]
+            
+            # Each stage only fills the slots the earlier ones left
+            rows = []
+            for condition in stages:
+                if len(rows) >= limit:
+                    break
+                rows += faculty.filter(
+                    condition, User.id.notin_([row.id for row in rows])
+                ).order_by(order).limit(limit - len(rows)).all()
+    
+    return [{'id': row.id, 'username': row.username, 'name': row.name} for row in rows]
+
+def resolve_user_id(username, user_id=None):
+    """Get a user's ID, skipping the lookup when the caller already knows it"""
+    if user_id is not None:
+        return user_id
     
-    # Create new publication
-    new_pub = Publication(
-        faculty_id=faculty.id,
-        title=title,
-        journal=journal,
-        year=year,
-        doi=doi
+    user = get_user_by_username(username)
+    return user.id if user else None
+
+def _keyset_page(query, id_column, limit, after_id):
+    """Fetch up to limit rows ordered by ID after a cursor, and whether more rows follow"""
+    if after_id is not None:
+        query = query.filter(id_column > after_id)
+    
+    # One extra row tells us if there is a next page
+    rows = query.order_by(id_column).limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
+
+def _next_cursor(page, has_more):
+    """Get the after_id cursor that continues from a page of record dictionaries"""
+    return page[-1]['id'] if has_more and page else None
+
+def _publication_to_dict(pub, faculty_username):
+    """Convert a publication row to a dictionary"""
+    return {
+        'id': pub.id,
+        'faculty_username': faculty_username,
+        'title': pub.title,
+        'journal': pub.journal,
+        'year': pub.year,
+        'doi': pub.doi
+    }
+
+def _experience_to_dict(exp, faculty_username):
+    """Convert an experience row to a dictionary"""
+    return {
+        'id': exp.id,
+        'faculty_username': faculty_username,
+        'institution': exp.institution,
+        'role': exp.role,
+        'duration': exp.duration,
+        'description': exp.description
+    }
+
+def _feedback_query(session, faculty_id):
+    """Query a faculty member's feedback with the student and dean usernames resolved"""
+    student = aliased(User)
+    dean = aliased(User)
+    return session.query(
+        Feedback,
+        student.username,
+        dean.username
+    ).outerjoin(
+        student, Feedback.student_id == student.id
+    ).outerjoin(
+        dean, Feedback.dean_id == dean.id
+    ).filter(
+        Feedback.faculty_id == faculty_id
     )
-    
-    session.add(new_pub)
-    session.commit()
-    pub_id = new_pub.id
-    session.close()
-    
-    return pub_id
 
+def _feedback_to_dict(row, faculty_username):
+    """Convert a feedback row from _feedback_query to a dictionary"""
+    feedback, student_username, dean_username = row
+    return {
+        'id': feedback.id,
+        'faculty_username': faculty_username,
+        'student_username': student_username,
+        'dean_username': dean_username,
+        'rating': feedback.rating,
+        'comment': feedback.comment,
+        'semester': feedback.semester,
+        'timestamp': feedback.timestamp.strftime("%Y-%m-%d %H:%M:%S") if feedback.timestamp else ""
+    }
+
+def get_faculty_publications(faculty_username, faculty_id=None):
+    """Get publications for a specific faculty member"""
+    with session_scope() as session:
+        # Get the faculty user
+        faculty_id = resolve_user_id(faculty_username, faculty_id)
+        if faculty_id is None:
+            return []
+        
+        # Get publications
+        publications = session.query(Publication).filter(
+            Publication.faculty_id == faculty_id
+        ).order_by(Publication.id).all()
+        
+        # Convert to list of dictionaries
+        return [_publication_to_dict(pub, faculty_username) for pub in publications]
+
+def get_faculty_publications_page(faculty_username, limit=PAGE_SIZE, after_id=None, faculty_id=None):
+    """Get one page of a faculty member's publications and the cursor for the next page"""
+    with session_scope() as session:
+        faculty_id = resolve_user_id(faculty_username, faculty_id)
+        if faculty_id is None:
+            return [], None
+        
+        query = session.query(Publication).filter(Publication.faculty_id == faculty_id)
+        publications, has_more = _keyset_page(query, Publication.id, limit, after_id)
+        
+        result = [_publication_to_dict(pub, faculty_username) for pub in publications]
+        return result, _next_cursor(result, has_more)
+
+@retry_on_lock
+def add_publication(faculty_username, title, journal, year, doi, faculty_id=None):
+    """Add a new publication for a faculty member"""
+    with session_scope() as session:
+        # Get the faculty user
+        faculty_id = resolve_user_id(faculty_username, faculty_id)
+        if faculty_id is None:
+            return None
+        
+        # Create new publication
+        new_pub = Publication(
+            faculty_id=faculty_id,
+            title=title,
+            journal=journal,
+            year=year,
+            doi=doi
+        )
+        
+        session.add(new_pub)
+        session.commit()
+        department_overview.invalidate()
+        record_versions.bump(faculty_id)
+        pub_id = new_pub.id
+        
+        return pub_id
+
+@retry_on_lock
 def update_publication(pub_id, title, journal, year, doi):
     """Update an existing publication"""
-    session = get_db_session()
-    
-    # Get the publication
-    pub = session.query(Publication).filter(Publication.id == pub_id).first()
-    if not pub:
-        session.close()
-        return False
-    
-    # Update publication
-    pub.title = title
-    pub.journal = journal
-    pub.year = year
-    pub.doi = doi
-    
-    session.commit()
-    session.close()
-    
-    return True
+    with session_scope() as session:
+        # Get the publication
+        pub = session.query(Publication).filter(Publication.id == pub_id).first()
+        if not pub:
+            return False
+        
+        # Update publication
+        pub.title = title
+        pub.journal = journal
+        pub.year = year
+        pub.doi = doi
+        
+        session.commit()
+        record_versions.bump(pub.faculty_id)
+        
+        return True
 
+@retry_on_lock
 def delete_publication(pub_id):
     """Delete a publication"""
-    session = get_db_session()
-    
-    # Get the publication
-    pub = session.query(Publication).filter(Publication.id == pub_id).first()
-    if not pub:
-        session.close()
-        return False
-    
-    # Delete publication
-    session.delete(pub)
-    session.commit()
-    session.close()
-    
-    return True
+    with session_scope() as session:
+        # Get the publication
+        pub = session.query(Publication).filter(Publication.id == pub_id).first()
+        if not pub:
+            return False
+        
+        # Delete publication
+        session.delete(pub)
+        session.commit()
+        department_overview.invalidate()
+        record_versions.bump(pub.faculty_id)
+        
+        return True
 
-def get_faculty_experiences(faculty_username):
+def get_faculty_experiences(faculty_username, faculty_id=None):
     """Get experiences for a specific faculty member"""
-    session = get_db_session()
-    
-    # Get the faculty user
-    faculty = get_user_by_username(faculty_username)
-    if not faculty:
-        session.close()
-        return []
-    
-    # Get experiences
-    experiences = session.query(Experience).filter(Experience.faculty_id == faculty.id).all()
-    
-    # Convert to list of dictionaries
-    result = []
-    for exp in experiences:
-        result.append({
-            'id': exp.id,
-            'faculty_username': faculty_username,
-            'institution': exp.institution,
-            'role': exp.role,
-            'duration': exp.duration,
-            'description': exp.description
-        })
-    
-    session.close()
-    return result
+    with session_scope() as session:
+        # Get the faculty user
+        faculty_id = resolve_user_id(faculty_username, faculty_id)
+        if faculty_id is None:
+            return []
+        
+        # Get experiences
+        experiences = session.query(Experience).filter(
+            Experience.faculty_id == faculty_id
+        ).order_by(Experience.id).all()
+        
+        # Convert to list of dictionaries
+        return [_experience_to_dict(exp, faculty_username) for exp in experiences]
 
-def add_experience(faculty_username, institution, role, duration, description):
+def get_faculty_experiences_page(faculty_username, limit=PAGE_SIZE, after_id=None, faculty_id=None):
+    """Get one page of a faculty member's experiences and the cursor for the next page"""
+    with session_scope() as session:
+        faculty_id = resolve_user_id(faculty_username, faculty_id)
+        if faculty_id is None:
+            return [], None
+        
+        query = session.query(Experience).filter(Experience.faculty_id == faculty_id)
+        experiences, has_more = _keyset_page(query, Experience.id, limit, after_id)
+        
+        result = [_experience_to_dict(exp, faculty_username) for exp in experiences]
+        return result, _next_cursor(result, has_more)
+
+@retry_on_lock
+def add_experience(faculty_username, institution, role, duration, description, faculty_id=None):
     """Add a new experience for a faculty member"""
-    session = get_db_session()
-    
-    # Get the faculty user
-    faculty = get_user_by_username(faculty_username)
-    if not faculty:
-        session.close()
-        return None
-    
-    # Create new experience
-    new_exp = Experience(
-        faculty_id=faculty.id,
-        institution=institution,
-        role=role,
-        duration=duration,
-        description=description
-    )
-    
-    session.add(new_exp)
-    session.commit()
-    exp_id = new_exp.id
-    session.close()
-    
-    return exp_id
+    with session_scope() as session:
+        # Get the faculty user
+        faculty_id = resolve_user_id(faculty_username, faculty_id)
+        if faculty_id is None:
+            return None
+        
+        # Create new experience
+        new_exp = Experience(
+            faculty_id=faculty_id,
+            institution=institution,
+            role=role,
+            duration=duration,
+            description=description
+        )
+        
+        session.add(new_exp)
+        session.commit()
+        department_overview.invalidate()
+        record_versions.bump(faculty_id)
+        exp_id = new_exp.id
+        
+        return exp_id
 
+@retry_on_lock
 def update_experience(exp_id, institution, role, duration, description):
     """Update an existing experience"""
-    session = get_db_session()
-    
-    # Get the experience
-    exp = session.query(Experience).filter(Experience.id == exp_id).first()
-    if not exp:
-        session.close()
-        return False
-    
-    # Update experience
-    exp.institution = institution
-    exp.role = role
-    exp.duration = duration
-    exp.description = description
-    
-    session.commit()
-    session.close()
-    
-    return True
+    with session_scope() as session:
+        # Get the experience
+        exp = session.query(Experience).filter(Experience.id == exp_id).first()
+        if not exp:
+            return False
+        
+        # Update experience
+        exp.institution = institution
+        exp.role = role
+        exp.duration = duration
+        exp.description = description
+        
+        session.commit()
+        record_versions.bump(exp.faculty_id)
+        
+        return True
 
+@retry_on_lock
 def delete_experience(exp_id):
     """Delete an experience"""
-    session = get_db_session()
-    
-    # Get the experience
-    exp = session.query(Experience).filter(Experience.id == exp_id).first()
-    if not exp:
-        session.close()
-        return False
-    
-    # Delete experience
-    session.delete(exp)
-    session.commit()
-    session.close()
-    
-    return True
+    with session_scope() as session:
+        # Get the experience
+        exp = session.query(Experience).filter(Experience.id == exp_id).first()
+        if not exp:
+            return False
+        
+        # Delete experience
+        session.delete(exp)
+        session.commit()
+        department_overview.invalidate()
+        record_versions.bump(exp.faculty_id)
+        
+        return True
 
-def get_faculty_feedback(faculty_username):
+def get_faculty_feedback(faculty_username, faculty_id=None):
     """Get feedback for a specific faculty member"""
-    session = get_db_session()
-    
-    # Get the faculty user
-    faculty = get_user_by_username(faculty_username)
-    if not faculty:
-        session.close()
-        return []
-    
-    # Get feedback
-    feedbacks = session.query(Feedback).filter(Feedback.faculty_id == faculty.id).all()
-    
-    # Convert to list of dictionaries
-    result = []
-    for feedback in feedbacks:
-        # Get related users
-        student_username = None
-        if feedback.student_id:
-            student = get_user_by_id(feedback.student_id)
-            student_username = student.username if student else None
-            
-        dean_username = None
-        if feedback.dean_id:
-            dean = get_user_by_id(feedback.dean_id)
-            dean_username = dean.username if dean else None
-        
-        result.append({
-            'id': feedback.id,
-            'faculty_username': faculty_username,
-            'student_username': student_username,
-            'dean_username': dean_username,
-            'rating': feedback.rating,
-            'comment': feedback.comment,
-            'semester': feedback.semester,
-            'timestamp': feedback.timestamp.strftime("%Y-%m-%d %H:%M:%S") if feedback.timestamp else ""
-        })
-    
-    session.close()
-    return result
+    with session_scope() as session:
+        faculty_id = resolve_user_id(faculty_username, faculty_id)
+        if faculty_id is None:
+            return []
+        
+        rows = _feedback_query(session, faculty_id).order_by(Feedback.id).all()
+        
+        # Convert to list of dictionaries
+        return [_feedback_to_dict(row, faculty_username) for row in rows]
+
+def get_faculty_feedback_page(faculty_username, limit=PAGE_SIZE, after_id=None, faculty_id=None):
+    """Get one page of a faculty member's feedback and the cursor for the next page"""
+    with session_scope() as session:
+        faculty_id = resolve_user_id(faculty_username, faculty_id)
+        if faculty_id is None:
+            return [], None
+        
+        rows, has_more = _keyset_page(_feedback_query(session, faculty_id), Feedback.id, limit, after_id)
+        
+        result = [_feedback_to_dict(row, faculty_username) for row in rows]
+        return result, _next_cursor(result, has_more)
+
+def get_faculty_record_counts(faculty_username, faculty_id=None):
+    """Get the number of publications, experiences and feedback entries for a faculty member
+    
+    'version' moves on every write this process makes to those records, including
+    edits that leave the counts unchanged.
+    """
+    with session_scope() as session:
+        faculty_id = resolve_user_id(faculty_username, faculty_id)
+        if faculty_id is None:
+            return {'publications': 0, 'experiences': 0, 'feedback': 0, 'version': 0}
+        
+        # All three counts in one statement
+        publications, experiences, feedback = session.query(
+            session.query(func.count(Publication.id)).filter(Publication.faculty_id == faculty_id).scalar_subquery(),
+            session.query(func.count(Experience.id)).filter(Experience.faculty_id == faculty_id).scalar_subquery(),
+            session.query(func.count(Feedback.id)).filter(Feedback.faculty_id == faculty_id).scalar_subquery()
+        ).one()
+        
+        return {
+            'publications': publications,
+            'experiences': experiences,
+            'feedback': feedback,
+            'version': record_versions.get(faculty_id)
+        }
 
 def has_given_feedback(student_username, faculty_username, semester):
     """Check if a student has already given feedback to a faculty in the current semester"""
-    session = get_db_session()
-    
-    # Get the student and faculty users
-    student = get_user_by_username(student_username)
-    faculty = get_user_by_username(faculty_username)
-    
-    if not student or not faculty:
-        session.close()
+    with session_scope() as session:
+        # Get the student and faculty users
+        student = get_user_by_username(student_username)
+        faculty = get_user_by_username(faculty_username)
+        
+        if not student or not faculty:
+            return False
+        
+        # Check if feedback exists
+        feedback_exists = session.query(Feedback).filter(
+            Feedback.student_id == student.id,
+            Feedback.faculty_id == faculty.id,
+            Feedback.semester == semester
+        ).first() is not None
+        
+        return feedback_exists
+
+def get_feedback_status_for_student(student_username, semester, student_id=None):
+    """Get the usernames of every faculty a student has given feedback to in a semester"""
+    with session_scope() as session:
+        student_id = resolve_user_id(student_username, student_id)
+        if student_id is None:
+            return set()
+        
+        # One query over the student's feedback for the semester
+        rows = session.query(User.username).join(
+            Feedback, Feedback.faculty_id == User.id
+        ).filter(
+            Feedback.student_id == student_id,
+            Feedback.semester == semester
+        ).distinct().all()
+        
+        return {username for (username,) in rows}
+
+def feedback_rollup_delta(rating, weight=1):
+    """Get the rollup change for adding (weight=1) or removing (weight=-1) one rating"""
+    star = min(max(int(rating + 0.5), RATING_SCALE[0]), RATING_SCALE[-1])
+    delta = {'rating_sum': rating * weight, 'rating_count': weight}
+    for bucket_star, column in zip(RATING_SCALE, ROLLUP_STAR_COLUMNS):
+        delta[column] = weight if bucket_star == star else 0
+    return delta
+
+def apply_feedback_rollup_deltas(session, deltas):
+    """Add rating changes, keyed by (faculty_id, semester, source_role), to the rollup rows"""
+    rows = [
+        dict(faculty_id=faculty_id, semester=semester, source_role=source_role, **delta)
+        for (faculty_id, semester, source_role), delta in deltas.items()
+    ]
+    if not rows:
+        return
+    
+    statement = dialect_insert(FeedbackRollup, bind=session.get_bind())
+    if statement is not None:
+        # Native upsert: create the row or add to its running totals
+        statement = statement.on_conflict_do_update(
+            index_elements=['faculty_id', 'semester', 'source_role'],
+            set_={
+                column: getattr(FeedbackRollup, column) + getattr(statement.excluded, column)
+                for column in ROLLUP_TOTAL_COLUMNS
+            }
+        )
+        session.execute(statement, rows)
+    else:
+        for row in rows:
+            rollup = session.get(FeedbackRollup, (row['faculty_id'], row['semester'], row['source_role']))
+            if rollup is None:
+                session.add(FeedbackRollup(**row))
+            else:
+                for column in ROLLUP_TOTAL_COLUMNS:
+                    setattr(rollup, column, getattr(rollup, column) + row[column])
+        session.flush()
+
+@retry_on_lock
+def add_feedback(from_username, from_role, faculty_username, rating, comment, semester, from_user_id=None):
+    """Add feedback for a faculty member"""
+    # Rollups are keyed by 'student' or 'dean', the role rebuild_feedback_rollups derives from the row
+    if from_role not in ('student', 'dean'):
+        return FEEDBACK_ROLE_REJECTED
+    
+    with session_scope() as session:
+        # Get the faculty user
+        faculty_id = resolve_user_id(faculty_username)
+        from_user_id = resolve_user_id(from_username, from_user_id)
+        
+        if faculty_id is None or from_user_id is None:
+            return False, "User not found."
+        
+        # Deans keep one rating per faculty per semester, a new one replaces it
+        if from_role == 'dean':
+            return upsert_dean_feedback(
+                from_username, faculty_username, rating, comment, semester, dean_id=from_user_id, faculty_id=faculty_id
+            )
+        
+        values = dict(
+            faculty_id=faculty_id,
+            student_id=from_user_id if from_role == 'student' else None,
+            dean_id=from_user_id if from_role == 'dean' else None,
+            rating=rating,
+            comment=comment,
+            semester=semester
+        )
+        
+        # Hand the row to the background writer, which commits it with other pending rows
+        if FEEDBACK_WRITER_ENABLED:
+            return feedback_writer.submit((values, from_role), busy_result=FEEDBACK_BUSY).result()
+        
+        if not _insert_feedback(session, values):
+            session.rollback()
+            return FEEDBACK_DUPLICATE
+        
+        # Update the rollup in the same transaction as the feedback row
+        apply_feedback_rollup_deltas(session, {
+            (faculty_id, semester, from_role): feedback_rollup_delta(rating)
+        })
+        session.commit()
+        department_overview.invalidate()
+        rating_trends.invalidate(faculty_id)
+        record_versions.bump(faculty_id)
+        
+        return FEEDBACK_SUBMITTED
+
+def _insert_feedback(session, values):
+    """Insert one feedback row, returning False when it duplicates a student rating"""
+    # The unique index allows one student rating per faculty per semester
+    statement = dialect_insert(Feedback, bind=session.get_bind())
+    if statement is not None:
+        # Native upsert: a duplicate student rating inserts nothing
+        statement = statement.values(**values).on_conflict_do_nothing(
+            index_elements=['student_id', 'faculty_id', 'semester']
+        )
+        return bool(session.execute(statement).rowcount)
+    
+    try:
+        with session.begin_nested():
+            session.add(Feedback(**values))
+    except IntegrityError:
         return False
+    return True
+
+@retry_on_lock
+def _write_feedback_batch(items):
+    """Insert queued (values, from_role) feedback rows and their rollups in one transaction"""
+    with session_scope() as session:
+        statement = dialect_insert(Feedback, bind=session.get_bind())
+        if statement is None:
+            inserted = [_insert_feedback(session, values) for values, _ in items]
+        else:
+            # One multi-row INSERT; RETURNING names the student ratings that were not duplicates
+            statement = statement.on_conflict_do_nothing(
+                index_elements=['student_id', 'faculty_id', 'semester']
+            ).returning(Feedback.student_id, Feedback.faculty_id, Feedback.semester)
+            accepted = set(session.execute(statement, [values for values, _ in items]).all())
+            inserted = []
+            for values, _ in items:
+                key = (values['student_id'], values['faculty_id'], values['semester'])
+                # Dean ratings never conflict; of two equal student ratings in a batch the first wins
+                inserted.append(values['student_id'] is None or key in accepted)
+                accepted.discard(key)
+        
+        results = []
+        deltas = {}
+        for (values, from_role), row_inserted in zip(items, inserted):
+            if not row_inserted:
+                results.append(FEEDBACK_DUPLICATE)
+                continue
+            
+            delta = feedback_rollup_delta(values['rating'])
+            total = deltas.setdefault((values['faculty_id'], values['semester'], from_role), dict.fromkeys(delta, 0))
+            for column, value in delta.items():
+                total[column] += value
+            results.append(FEEDBACK_SUBMITTED)
+        
+        apply_feedback_rollup_deltas(session, deltas)
+        session.commit()
+    department_overview.invalidate()
+    rating_trends.invalidate(*{values['faculty_id'] for values, _ in items})
+    record_versions.bump(*{values['faculty_id'] for values, _ in items})
     
-    # Check if feedback exists
-    feedback_exists = session.query(Feedback).filter(
-        Feedback.student_id == student.id,
-        Feedback.faculty_id == faculty.id,
-        Feedback.semester == semester
-    ).first() is not None
-    
-    session.close()
-    return feedback_exists
+    return results
 
-def add_feedback(from_username, from_role, faculty_username, rating, comment, semester):
-    """Add feedback for a faculty member"""
-    session = get_db_session()
-    
-    # Get the faculty user
-    faculty = get_user_by_username(faculty_username)
-    from_user = get_user_by_username(from_username)
-    
-    if not faculty or not from_user:
-        session.close()
-        return False, "User not found."
-    
-    # For students, check if already given feedback this semester
-    if from_role == 'student' and has_given_feedback(from_username, faculty_username, semester):
-        session.close()
-        return False, "You have already submitted feedback for this faculty this semester."
-    
-    # Create feedback object
-    new_feedback = Feedback(
-        faculty_id=faculty.id,
-        student_id=from_user.id if from_role == 'student' else None,
-        dean_id=from_user.id if from_role == 'dean' else None,
-        rating=rating,
-        comment=comment,
-        semester=semester
-    )
+# Shared by every Streamlit session in this process, started by the first submission
+feedback_writer = FeedbackWriter(_write_feedback_batch)
+
+def get_dean_feedback(dean_username, faculty_username, semester, dean_id=None, faculty_id=None):
+    """Get a dean's rating of a faculty member for a semester, or None if there is none yet"""
+    dean_id = resolve_user_id(dean_username, dean_id)
+    faculty_id = resolve_user_id(faculty_username, faculty_id)
+    if dean_id is None or faculty_id is None:
+        return None
     
-    session.add(new_feedback)
-    session.commit()
+    with session_scope() as session:
+        # Point lookup on the unique (dean_id, faculty_id, semester) index
+        row = session.query(Feedback.id, Feedback.rating, Feedback.comment, Feedback.timestamp).filter(
+            Feedback.dean_id == dean_id,
+            Feedback.faculty_id == faculty_id,
+            Feedback.semester == semester
+        ).first()
     
-    session.close()
-    return True, "Feedback submitted successfully."
+    if row is None:
+        return None
+    return {'id': row.id, 'rating': row.rating, 'comment': row.comment, 'timestamp': row.timestamp}
 
-def get_feedback_summary(faculty_username):
-    """Get average rating and comments for a faculty member"""
-    feedback = get_faculty_feedback(faculty_username)
-    
-    if not feedback:
-        return {
-            'avg_rating': 0,
+@retry_on_lock
+def upsert_dean_feedback(dean_username, faculty_username, rating, comment, semester, dean_id=None, faculty_id=None):
+    """Add or replace a dean's rating of a faculty member for a semester
+    
+    The row is written with one INSERT ... ON CONFLICT DO UPDATE on the unique
+    (dean_id, faculty_id, semester) key, and the rollup moves by the difference
+    between the old and the new rating in the same transaction.
+    """
+    with session_scope() as session:
+        dean_id = resolve_user_id(dean_username, dean_id)
+        faculty_id = resolve_user_id(faculty_username, faculty_id)
+        if dean_id is None or faculty_id is None:
+            return False, "User not found."
+        
+        # Write-lock the dean's user row first, so concurrent ratings by this dean run one
+        # after the other and the rating read below is the one being replaced. Locking
+        # the feedback row misses a first rating, which has no row yet, and both writers
+        # would add a full rating to the rollup. The no-op UPDATE takes a row lock on
+        # PostgreSQL and opens the write transaction on SQLite, which skips FOR UPDATE.
+        session.execute(update(User).where(User.id == dean_id).values(id=User.id))
+        
+        # The rating being replaced
+        previous = session.query(Feedback.rating).filter(
+            Feedback.dean_id == dean_id,
+            Feedback.faculty_id == faculty_id,
+            Feedback.semester == semester
+        ).scalar()
+        
+        values = dict(faculty_id=faculty_id, dean_id=dean_id, rating=rating, comment=comment, semester=semester)
+        statement = dialect_insert(Feedback, bind=session.get_bind())
+        if statement is not None:
+            statement = statement.values(**values)
+            session.execute(statement.on_conflict_do_update(
+                index_elements=['dean_id', 'faculty_id', 'semester'],
+                set_={
+                    'rating': statement.excluded.rating,
+                    'comment': statement.excluded.comment,
+                    'timestamp': func.now()
+                }
+            ))
+        else:
+            feedback = session.query(Feedback).filter_by(
+                dean_id=dean_id, faculty_id=faculty_id, semester=semester
+            ).first()
+            if feedback is None:
+                session.add(Feedback(**values))
+            else:
+                feedback.rating, feedback.comment, feedback.timestamp = rating, comment, func.now()
+            session.flush()
+        
+        delta = feedback_rollup_delta(rating)
+        if previous is not None:
+            for column, value in feedback_rollup_delta(previous, weight=-1).items():
+                delta[column] += value
+        apply_feedback_rollup_deltas(session, {(faculty_id, semester, 'dean'): delta})
+        session.commit()
+        department_overview.invalidate()
+        rating_trends.invalidate(faculty_id)
+        record_versions.bump(faculty_id)
+        
+        return FEEDBACK_SUBMITTED if previous is None else FEEDBACK_UPDATED
+
+def _load_rating_trend(faculty_id):
+    """Compute per-semester rating statistics and rolling averages for one faculty member"""
+    stars = func.round(Feedback.rating)
+    with session_scope() as session:
+        # One grouped query, the standard deviation comes from the sum of squares
+        rows = session.query(
+            Feedback.semester,
+            func.count(Feedback.id),
+            func.sum(Feedback.rating),
+            func.sum(Feedback.rating * Feedback.rating),
+            *[func.sum(case((stars == star, 1), else_=0)) for star in RATING_SCALE]
+        ).filter(Feedback.faculty_id == faculty_id).group_by(Feedback.semester).order_by(Feedback.semester).all()
+    
+    star_columns = [f"stars_{star}" for star in RATING_SCALE]
+    trend = pd.DataFrame(rows, columns=['semester', 'count', 'rating_sum', 'rating_sq_sum'] + star_columns)
+    counts = trend['count']
+    trend['mean'] = trend['rating_sum'] / counts
+    
+    # Sample standard deviation, undefined for a single rating; clipped against rounding below zero
+    variance = (trend['rating_sq_sum'] - trend['rating_sum'] ** 2 / counts) / (counts - 1)
+    trend['std'] = variance.clip(lower=0).pow(0.5).where(counts > 1)
+    
+    # Rolling and cumulative averages weighted by the number of ratings per semester
+    window = trend[['rating_sum', 'count']].rolling(TREND_WINDOW, min_periods=1).sum()
+    trend['rolling_mean'] = window['rating_sum'] / window['count']
+    trend['cumulative_mean'] = trend['rating_sum'].cumsum() / counts.cumsum()
+    
+    trend[['mean', 'std', 'rolling_mean', 'cumulative_mean']] = trend[['mean', 'std', 'rolling_mean', 'cumulative_mean']].round(2)
+    trend = trend.astype(object).where(trend.notna(), None)
+    
+    semesters = []
+    for record in trend.to_dict('records'):
+        semesters.append({
+            'semester': record['semester'],
+            'count': record['count'],
+            'mean': record['mean'],
+            'std': record['std'],
+            'rolling_mean': record['rolling_mean'],
+            'cumulative_mean': record['cumulative_mean'],
+            'distribution': {star: record[column] for star, column in zip(RATING_SCALE, star_columns)}
+        })
+    return semesters
+
+def get_rating_trend(faculty_username, faculty_id=None):
+    """Get a faculty member's rating per semester, oldest first
+    
+    Each semester has the number of ratings, their mean and standard deviation, the
+    star distribution, the mean over the last TREND_WINDOW semesters and the mean of
+    all semesters so far. Results are cached per faculty until new feedback arrives.
+    """
+    faculty_id = resolve_user_id(faculty_username, faculty_id)
+    if faculty_id is None:
+        return []
+    return rating_trends.get(faculty_id, lambda: _load_rating_trend(faculty_id))
+
+def get_feedback_summary(faculty_username, include_feedback=False, faculty_id=None):
+    """Get average rating, counts, semester breakdown and rating histogram for a faculty member"""
+    faculty_id = resolve_user_id(faculty_username, faculty_id)
+    
+    with session_scope() as session:
+        # Read the maintained rollups, at most two rows per semester
+        rollups = session.query(FeedbackRollup).filter(
+            FeedbackRollup.faculty_id == faculty_id
+        ).order_by(FeedbackRollup.semester).all()
+    
+    total_count = 0
+    total_rating = 0
+    student_count = 0
+    dean_count = 0
+    histogram = {star: 0 for star in RATING_SCALE}
+    semesters = {}
+    for rollup in rollups:
+        total_count += rollup.rating_count
+        total_rating += rollup.rating_sum
+        if rollup.source_role == 'student':
+            student_count += rollup.rating_count
+        else:
+            dean_count += rollup.rating_count
+        for star, column in zip(RATING_SCALE, ROLLUP_STAR_COLUMNS):
+            histogram[star] += getattr(rollup, column)
+        
+        semester = semesters.setdefault(rollup.semester, {
+            'semester': rollup.semester,
+            'rating_sum': 0,
+            'count': 0,
             'student_count': 0,
-            'dean_count': 0,
-            'feedback': []
-        }
+            'dean_count': 0
+        })
+        semester['rating_sum'] += rollup.rating_sum
+        semester['count'] += rollup.rating_count
+        semester[f"{rollup.source_role}_count"] += rollup.rating_count
+    
+    by_semester = []
+    for semester in semesters.values():
+        by_semester.append({
+            'semester': semester['semester'],
+            'avg_rating': round(semester['rating_sum'] / semester['count'], 1) if semester['count'] else 0,
+            'count': semester['count'],
+            'student_count': semester['student_count'],
+            'dean_count': semester['dean_count']
+        })
     
-    ratings = [f['rating'] for f in feedback]
-    avg_rating = sum(ratings) / len(ratings) if ratings else 0
+    avg_rating = total_rating / total_count if total_count else 0
     
-    student_count = sum(1 for f in feedback if f['student_username'] is not None)
-    dean_count = sum(1 for f in feedback if f['dean_username'] is not None)
+    # Individual feedback rows are only fetched when the caller displays them
+    feedback = get_faculty_feedback(faculty_username, faculty_id) if include_feedback and total_count else []
     
     return {
         'avg_rating': round(avg_rating, 1),
         'student_count': student_count,
         'dean_count': dean_count,
+        'by_semester': by_semester,
+        'histogram': histogram,
         'feedback': feedback
     }
 
+def _first_page_with_total(query, id_column, limit):
+    """Fetch the first page of a query and the number of rows it matches in one statement"""
+    # The window count is taken over every matching row, before LIMIT applies
+    rows = query.add_columns(func.count().over()).order_by(id_column).limit(limit + 1).all()
+    total = rows[0][-1] if rows else 0
+    return [row[:-1] for row in rows[:limit]], len(rows) > limit, total
+
+def _load_profile_pages(faculty, sections, limit):
+    """Build a profile holding the first page of each requested section, one statement per section"""
+    profile = {
+        'id': faculty.id,
+        'username': faculty.username,
+        'name': faculty.name,
+        'publications': None,
+        'experiences': None,
+        'feedback': None,
+        'summary': None,
+        'totals': {},
+        'next_after_id': {},
+        'version': record_versions.get(faculty.id)
+    }
+    
+    with session_scope() as session:
+        pages = {
+            'publications': (
+                session.query(Publication).filter(Publication.faculty_id == faculty.id), Publication.id,
+                lambda row: _publication_to_dict(row[0], faculty.username)
+            ),
+            'experiences': (
+                session.query(Experience).filter(Experience.faculty_id == faculty.id), Experience.id,
+                lambda row: _experience_to_dict(row[0], faculty.username)
+            ),
+            'feedback': (
+                _feedback_query(session, faculty.id), Feedback.id,
+                lambda row: _feedback_to_dict(row, faculty.username)
+            )
+        }
+        for section in sections:
+            query, id_column, to_dict = pages[section]
+            rows, has_more, total = _first_page_with_total(query, id_column, limit)
+            profile[section] = [to_dict(row) for row in rows]
+            profile['totals'][section] = total
+            profile['next_after_id'][section] = _next_cursor(profile[section], has_more)
+        
+        if 'feedback' in sections:
+            profile['summary'] = get_feedback_summary(faculty.username, faculty_id=faculty.id)
+    
+    return profile
+
+def get_faculty_profile(faculty_username, sections=PROFILE_SECTIONS, faculty_id=None, limit=None):
+    """Load a faculty member with the requested sections in one session
+    
+    Each requested collection is eager-loaded with one selectin query, sections that
+    are not requested are not queried and come back as None. Loading 'feedback' also
+    includes the rollup summary.
+    
+    With a limit only the first page of each section is loaded, in one statement per
+    section that also counts its rows, and the identity comes from the user directory.
+    'totals' and 'next_after_id' then hold each section's count and next-page cursor
+    for the *_page functions, and 'version' the faculty member's write version.
+    """
+    faculty_id = resolve_user_id(faculty_username, faculty_id)
+    if faculty_id is None:
+        return None
+    
+    if limit is not None:
+        faculty = get_user_by_id(faculty_id)
+        return _load_profile_pages(faculty, sections, limit) if faculty else None
+    
+    loaders = {
+        'publications': selectinload(User.publications),
+        'experiences': selectinload(User.experiences),
+        'feedback': selectinload(User.feedbacks_received).options(
+            joinedload(Feedback.student), joinedload(Feedback.dean)
+        )
+    }
+    
+    with session_scope() as session:
+        # Refresh collections the shared session may hold from before a write
+        faculty = session.query(User).options(
+            *[loaders[section] for section in sections]
+        ).filter(User.id == faculty_id).execution_options(populate_existing=True).first()
+        if faculty is None:
+            return None
+        
+        profile = {
+            'id': faculty.id,
+            'username': faculty.username,
+            'name': faculty.name,
+            'publications': None,
+            'experiences': None,
+            'feedback': None,
+            'summary': None
+        }
+        by_id = lambda row: row.id
+        
+        if 'publications' in sections:
+            profile['publications'] = [
+                _publication_to_dict(pub, faculty.username) for pub in sorted(faculty.publications, key=by_id)
+            ]
+        if 'experiences' in sections:
+            profile['experiences'] = [
+                _experience_to_dict(exp, faculty.username) for exp in sorted(faculty.experiences, key=by_id)
+            ]
+        if 'feedback' in sections:
+            profile['feedback'] = [
+                _feedback_to_dict((
+                    feedback,
+                    feedback.student.username if feedback.student else None,
+                    feedback.dean.username if feedback.dean else None
+                ), faculty.username)
+                for feedback in sorted(faculty.feedbacks_received, key=by_id)
+            ]
+            profile['summary'] = get_feedback_summary(faculty.username, faculty_id=faculty.id)
+        
+        return profile
+
+def _load_department_overview():
+    """Compute rating totals and record counts for every faculty member in one grouped query"""
+    ratings = select(
+        FeedbackRollup.faculty_id,
+        func.sum(FeedbackRollup.rating_sum).label('rating_sum'),
+        func.sum(FeedbackRollup.rating_count).label('rating_count'),
+        func.sum(case((FeedbackRollup.source_role == 'student', FeedbackRollup.rating_count), else_=0)).label('student_count'),
+        func.sum(case((FeedbackRollup.source_role == 'dean', FeedbackRollup.rating_count), else_=0)).label('dean_count')
+    ).group_by(FeedbackRollup.faculty_id).subquery()
+    publications = select(
+        Publication.faculty_id, func.count(Publication.id).label('publications')
+    ).group_by(Publication.faculty_id).subquery()
+    experiences = select(
+        Experience.faculty_id, func.count(Experience.id).label('experiences')
+    ).group_by(Experience.faculty_id).subquery()
+    
+    with session_scope() as session:
+        rows = session.execute(
+            select(
+                User.username,
+                User.name,
+                ratings.c.rating_sum,
+                func.coalesce(ratings.c.rating_count, 0),
+                func.coalesce(ratings.c.student_count, 0),
+                func.coalesce(ratings.c.dean_count, 0),
+                func.coalesce(publications.c.publications, 0),
+                func.coalesce(experiences.c.experiences, 0)
+            )
+            .outerjoin(ratings, ratings.c.faculty_id == User.id)
+            .outerjoin(publications, publications.c.faculty_id == User.id)
+            .outerjoin(experiences, experiences.c.faculty_id == User.id)
+            .where(User.role == 'faculty')
+            .order_by(User.id)
+        ).all()
+    
+    overview = []
+    for username, name, rating_sum, rating_count, student_count, dean_count, pub_count, exp_count in rows:
+        overview.append({
+            'username': username,
+            'name': name,
+            'avg_rating': round(rating_sum / rating_count, 2) if rating_count else None,
+            'rating_count': rating_count,
+            'student_count': student_count,
+            'dean_count': dean_count,
+            'publications': pub_count,
+            'experiences': exp_count
+        })
+    
+    return overview
+
+def get_department_overview():
+    """Get average rating, rating counts, publication and experience counts for every faculty member"""
+    return department_overview.get(_load_department_overview)
+
 def get_current_semester():
     """Get the current academic semester"""
     return st.session_state.current_semester
@@ -1,15 +1,131 @@
 import os
+import time
+import logging
+import random
+import functools
+import threading
 import streamlit as st
-from sqlalchemy import create_engine, Column, Integer, String, Float, Text, ForeignKey, DateTime, func
+from contextlib import contextmanager
+from sqlalchemy import create_engine, make_url, URL, event, Column, Integer, String, Float, Text, ForeignKey, DateTime, Index, case, delete, func, select, text
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.pool import StaticPool
 import datetime
+from passwords import hash_password
 
-# Use SQLite database
+logger = logging.getLogger(__name__)
+
+# SQLite database used when DATABASE_URL is not set
 DATABASE_PATH = "faculty_appraisal.db"
 
+# Connection pool settings, overridable with DB_POOL_SIZE, DB_MAX_OVERFLOW,
+# DB_POOL_PRE_PING and DB_POOL_RECYCLE
+POOL_SETTINGS = {
+    'pool_size': 5,
+    'max_overflow': 10,
+    'pool_pre_ping': True,      # drop connections the server closed while idle
+    'pool_recycle': 1800,       # seconds before a pooled connection is replaced
+}
+
+# Settings applied to every new SQLite connection.
+# Each can be overridden with an environment variable, e.g. SQLITE_SYNCHRONOUS=FULL.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',        # readers no longer block the writer
+    'synchronous': 'NORMAL',      # safe with WAL, fsync only at checkpoints
+    'cache_size': '-65536',       # 64 MiB page cache per connection
+    'mmap_size': '268435456',     # 256 MiB memory-mapped I/O
+    'temp_store': 'MEMORY',
+    'busy_timeout': '5000',       # wait up to 5s for a lock before failing
+}
+
+# Writes that still hit a lock are retried with exponential backoff
+LOCK_RETRY_ATTEMPTS = 5
+LOCK_RETRY_BASE_DELAY = 0.05
+
+def get_sqlite_pragmas():
+    """Get the SQLite engine profile with environment overrides applied"""
+    return {
+        name: os.environ.get(f"SQLITE_{name.upper()}", value)
+        for name, value in SQLITE_PRAGMAS.items()
+    }
+
+def get_database_url():
+    """Get the database URL from DATABASE_URL or the PG* variables, falling back to SQLite"""
+    url = os.environ.get("DATABASE_URL")
+    if url:
+        # Some hosts still hand out the scheme SQLAlchemy no longer accepts
+        if url.startswith("postgres://"):
+            url = "postgresql://" + url[len("postgres://"):]
+        return url
+    
+    if os.environ.get("PGHOST") and os.environ.get("PGDATABASE"):
+        return URL.create(
+            "postgresql",
+            username=os.environ.get("PGUSER"),
+            password=os.environ.get("PGPASSWORD"),
+            host=os.environ["PGHOST"],
+            port=int(os.environ["PGPORT"]) if os.environ.get("PGPORT") else None,
+            database=os.environ["PGDATABASE"]
+        ).render_as_string(hide_password=False)
+    
+    return f"sqlite:///{DATABASE_PATH}"
+
+def get_pool_settings():
+    """Get the connection pool settings with environment overrides applied"""
+    settings = {}
+    for name, value in POOL_SETTINGS.items():
+        override = os.environ.get(f"DB_{name.upper()}")
+        if override is None:
+            settings[name] = value
+        elif isinstance(value, bool):
+            settings[name] = override.lower() in ("1", "true", "yes")
+        else:
+            settings[name] = int(override)
+    return settings
+
+def create_database_engine(url=None):
+    """Create the engine for a database URL, using DATABASE_URL when none is given"""
+    url = make_url(url or get_database_url())
+    if url.get_backend_name() == "sqlite":
+        if url.database in (None, "", ":memory:"):
+            # One shared connection, so every thread sees the same in-memory database;
+            # pool sizing does not apply to it
+            return create_sqlite_engine(":memory:", poolclass=StaticPool)
+        return create_sqlite_engine(url.database, **get_pool_settings())
+    return create_engine(url, **get_pool_settings())
+
+def create_sqlite_engine(path, pragmas=None, **engine_options):
+    """Create an engine for a SQLite file with the given PRAGMA profile"""
+    sqlite_engine = create_engine(
+        f"sqlite:///{path}",
+        connect_args={"check_same_thread": False},
+        **engine_options
+    )
+    pragmas = get_sqlite_pragmas() if pragmas is None else pragmas
+    
+    @event.listens_for(sqlite_engine, "connect")
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+    
+    return sqlite_engine
+
+def dialect_insert(model, bind=None):
+    """Get an INSERT for a model with the backend's native upsert clauses, or None"""
+    dialect_name = (bind or engine).dialect.name
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert(model)
+
 # Create SQLAlchemy engine
-engine = create_engine(f"sqlite:///{DATABASE_PATH}", connect_args={"check_same_thread": False})
+engine = create_database_engine()
 
 # Create base class for models
 Base = declarative_base()
@@ -17,6 +133,10 @@ Base = declarative_base()
 # Define models
 class User(Base):
     __tablename__ = 'users'
+    __table_args__ = (
+        Index('ix_users_role_name', 'role', 'name'),
+        Index('ix_users_username_role', 'username', 'role'),
+    )
     
     id = Column(Integer, primary_key=True)
     username = Column(String(50), unique=True, nullable=False)
@@ -31,8 +151,17 @@ class User(Base):
     feedbacks_given_as_student = relationship("Feedback", back_populates="student", foreign_keys="Feedback.student_id")
     feedbacks_given_as_dean = relationship("Feedback", back_populates="dean", foreign_keys="Feedback.dean_id")
 
+# Case-insensitive indexes let SQLite answer the faculty picker's prefix LIKE
+# searches with index range scans
+Index('ix_users_role_name_nocase', User.role, User.name.collate('NOCASE')).ddl_if(dialect='sqlite')
+Index('ix_users_role_username_nocase', User.role, User.username.collate('NOCASE')).ddl_if(dialect='sqlite')
+
 class Publication(Base):
     __tablename__ = 'publications'
+    __table_args__ = (
+        Index('ix_publications_faculty_id', 'faculty_id'),
+        Index('ix_publications_faculty_doi', 'faculty_id', 'doi'),
+    )
     
     id = Column(Integer, primary_key=True)
     faculty_id = Column(Integer, ForeignKey('users.id'), nullable=False)
@@ -46,6 +175,9 @@ class Publication(Base):
 
 class Experience(Base):
     __tablename__ = 'experiences'
+    __table_args__ = (
+        Index('ix_experiences_faculty_id', 'faculty_id'),
+    )
     
     id = Column(Integer, primary_key=True)
     faculty_id = Column(Integer, ForeignKey('users.id'), nullable=False)
@@ -59,6 +191,13 @@ class Experience(Base):
 
 class Feedback(Base):
     __tablename__ = 'feedback'
+    __table_args__ = (
+        Index('ix_feedback_faculty_semester', 'faculty_id', 'semester'),
+        # One student rating per faculty per semester (dean rows have a NULL student_id)
+        Index('uq_feedback_student_faculty_semester', 'student_id', 'faculty_id', 'semester', unique=True),
+        # One dean rating per faculty per semester, updated in place (student rows have a NULL dean_id)
+        Index('uq_feedback_dean_faculty_semester', 'dean_id', 'faculty_id', 'semester', unique=True),
+    )
     
     id = Column(Integer, primary_key=True)
     faculty_id = Column(Integer, ForeignKey('users.id'), nullable=False)
@@ -74,34 +213,327 @@ class Feedback(Base):
     student = relationship("User", foreign_keys=[student_id], back_populates="feedbacks_given_as_student")
     dean = relationship("User", foreign_keys=[dean_id], back_populates="feedbacks_given_as_dean")
 
+class FeedbackRollup(Base):
+    __tablename__ = 'feedback_rollups'
+    
+    # Running totals of Feedback rows, maintained by every feedback write
+    faculty_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    semester = Column(String(20), primary_key=True)
+    source_role = Column(String(20), primary_key=True)  # 'student' or 'dean'
+    rating_sum = Column(Float, nullable=False, default=0)
+    rating_count = Column(Integer, nullable=False, default=0)
+    
+    # Rating histogram, one bucket per star
+    stars_1 = Column(Integer, nullable=False, default=0)
+    stars_2 = Column(Integer, nullable=False, default=0)
+    stars_3 = Column(Integer, nullable=False, default=0)
+    stars_4 = Column(Integer, nullable=False, default=0)
+    stars_5 = Column(Integer, nullable=False, default=0)
+
+# Histogram bucket columns of FeedbackRollup in star order
+ROLLUP_STAR_COLUMNS = ('stars_1', 'stars_2', 'stars_3', 'stars_4', 'stars_5')
+
+def rebuild_feedback_rollups(connection):
+    """Recompute every FeedbackRollup row from the Feedback table"""
+    connection.execute(delete(FeedbackRollup))
+    
+    source_role = case((Feedback.student_id.isnot(None), 'student'), else_='dean')
+    stars = func.round(Feedback.rating)
+    totals = select(
+        Feedback.faculty_id,
+        Feedback.semester,
+        source_role,
+        func.sum(Feedback.rating),
+        func.count(Feedback.id),
+        *[func.sum(case((stars == star, 1), else_=0)) for star in range(1, len(ROLLUP_STAR_COLUMNS) + 1)]
+    ).group_by(Feedback.faculty_id, Feedback.semester, source_role)
+    
+    connection.execute(FeedbackRollup.__table__.insert().from_select(
+        ['faculty_id', 'semester', 'source_role', 'rating_sum', 'rating_count', *ROLLUP_STAR_COLUMNS],
+        totals
+    ))
+
+# SQLite FTS5 indexes over publication titles/journals and feedback comments. They
+# use the base tables as external content and are kept in sync by triggers. Prefix
+# indexes keep short typed prefixes from merging thousands of term lists.
+SEARCH_INDEX_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS publications_fts USING fts5("
+    "title, journal, content='publications', content_rowid='id', prefix='2 3 4', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    # Title matches weigh twice as much as journal matches
+    "INSERT INTO publications_fts(publications_fts, rank) VALUES ('rank', 'bm25(2.0, 1.0)')",
+    "CREATE TRIGGER IF NOT EXISTS publications_fts_insert AFTER INSERT ON publications BEGIN "
+    "INSERT INTO publications_fts(rowid, title, journal) VALUES (new.id, new.title, new.journal); END",
+    "CREATE TRIGGER IF NOT EXISTS publications_fts_delete AFTER DELETE ON publications BEGIN "
+    "INSERT INTO publications_fts(publications_fts, rowid, title, journal) VALUES ('delete', old.id, old.title, old.journal); END",
+    "CREATE TRIGGER IF NOT EXISTS publications_fts_update AFTER UPDATE OF title, journal ON publications BEGIN "
+    "INSERT INTO publications_fts(publications_fts, rowid, title, journal) VALUES ('delete', old.id, old.title, old.journal); "
+    "INSERT INTO publications_fts(rowid, title, journal) VALUES (new.id, new.title, new.journal); END",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS feedback_fts USING fts5("
+    "comment, content='feedback', content_rowid='id', prefix='2 3 4', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS feedback_fts_insert AFTER INSERT ON feedback BEGIN "
+    "INSERT INTO feedback_fts(rowid, comment) VALUES (new.id, new.comment); END",
+    "CREATE TRIGGER IF NOT EXISTS feedback_fts_delete AFTER DELETE ON feedback BEGIN "
+    "INSERT INTO feedback_fts(feedback_fts, rowid, comment) VALUES ('delete', old.id, old.comment); END",
+    "CREATE TRIGGER IF NOT EXISTS feedback_fts_update AFTER UPDATE OF comment ON feedback BEGIN "
+    "INSERT INTO feedback_fts(feedback_fts, rowid, comment) VALUES ('delete', old.id, old.comment); "
+    "INSERT INTO feedback_fts(rowid, comment) VALUES (new.id, new.comment); END",
+]
+
+# Full-text tables rebuilt from their content tables by rebuild_search_index
+SEARCH_INDEX_TABLES = ('publications_fts', 'feedback_fts')
+
+def search_index_supported(connection):
+    """Check whether the database can hold the FTS5 search index"""
+    return connection.dialect.name == 'sqlite'
+
+def rebuild_search_index(connection):
+    """Recompute the full-text search tables from the publications and feedback tables"""
+    if not search_index_supported(connection):
+        return
+    for table in SEARCH_INDEX_TABLES:
+        connection.execute(text(f"INSERT INTO {table}({table}) VALUES ('rebuild')"))
+
+class SchemaMigration(Base):
+    __tablename__ = 'schema_migrations'
+    
+    version = Column(Integer, primary_key=True)
+    description = Column(String(200), nullable=False)
+    applied_at = Column(DateTime, default=func.now())
+
+# Migrations bring databases created by older versions up to the current models.
+# Each one must be safe to run against a database that create_all just built.
+def _model_index(name):
+    """Get a model index by name"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name == name:
+                return index
+    raise KeyError(f"No model index named {name!r}.")
+
+def _create_indexes(connection, *names):
+    """Create the named model indexes unless they already exist
+    
+    Migrations name their indexes instead of passing a table's index list, which
+    also holds indexes that later migrations add after preparing the data.
+    """
+    for name in names:
+        _model_index(name).create(connection, checkfirst=True)
+
+def _duplicate_feedback_condition(rater_column, keep):
+    """SQL condition for every feedback row but the one kept per rater, faculty and semester"""
+    return (
+        f"{rater_column} IS NOT NULL AND id NOT IN ("
+        f"SELECT {keep}(id) FROM feedback WHERE {rater_column} IS NOT NULL "
+        f"GROUP BY {rater_column}, faculty_id, semester)"
+    )
+
+# Rows deleted by the migrations that remove data, by version. Migration 1 keeps
+# the first student rating and migration 7 the latest dean rating.
+DUPLICATE_FEEDBACK_CONDITIONS = {
+    1: _duplicate_feedback_condition('student_id', 'MIN'),
+    7: _duplicate_feedback_condition('dean_id', 'MAX'),
+}
+
+class DestructiveMigrationPending(RuntimeError):
+    """Raised when a pending migration would delete rows and deletes were not allowed"""
+    
+    def __init__(self, version, description, rows):
+        super().__init__(
+            f"Migration {version} ({description}) would delete {rows} duplicate feedback rows. "
+            f"Back up the database, run `python manage.py migrate`, then restart the app."
+        )
+        self.version = version
+        self.rows = rows
+
+def _count_migration_deletes(connection, version):
+    """Count the rows a pending migration would delete"""
+    condition = DUPLICATE_FEEDBACK_CONDITIONS.get(version)
+    if condition is None:
+        return 0
+    return connection.execute(text(f"SELECT COUNT(*) FROM feedback WHERE {condition}")).scalar()
+
+def _delete_duplicate_feedback(connection, version):
+    """Delete the duplicate feedback rows of a migration and log how many there were"""
+    deleted = connection.execute(text(f"DELETE FROM feedback WHERE {DUPLICATE_FEEDBACK_CONDITIONS[version]}")).rowcount
+    if deleted:
+        logger.warning("Migration %d deleted %d duplicate feedback rows.", version, deleted)
+    return deleted
+
+def _migrate_access_path_indexes(connection):
+    """Add lookup indexes and the one-rating-per-semester constraint"""
+    # Keep the first rating when older databases hold student duplicates
+    deleted = _delete_duplicate_feedback(connection, 1)
+    _create_indexes(
+        connection,
+        'ix_users_role_name',
+        'ix_publications_faculty_id',
+        'ix_experiences_faculty_id',
+        'ix_feedback_faculty_semester',
+        'uq_feedback_student_faculty_semester'
+    )
+    return deleted
+
+def _migrate_feedback_rollups(connection):
+    """Add the feedback rollup table and fill it from existing feedback"""
+    FeedbackRollup.__table__.create(connection, checkfirst=True)
+    rebuild_feedback_rollups(connection)
+
+def _migrate_publication_doi_index(connection):
+    """Add the per-faculty DOI index used to skip duplicate imports"""
+    _create_indexes(connection, 'ix_publications_faculty_doi')
+
+def _migrate_search_index(connection):
+    """Add the full-text search tables and triggers, then index existing rows"""
+    # Other databases fall back to LIKE queries in search.py
+    if not search_index_supported(connection):
+        return
+    for statement in SEARCH_INDEX_DDL:
+        connection.execute(text(statement))
+    rebuild_search_index(connection)
+
+def _migrate_user_search_indexes(connection):
+    """Add the case-insensitive name and username indexes used by the faculty picker"""
+    _create_indexes(connection, 'ix_users_role_name_nocase', 'ix_users_role_username_nocase')
+
+def _migrate_login_index(connection):
+    """Add the (username, role) index used by login lookups"""
+    _create_indexes(connection, 'ix_users_username_role')
+
+def _migrate_unique_dean_feedback(connection):
+    """Keep only the latest dean rating per faculty per semester and enforce it"""
+    deleted = _delete_duplicate_feedback(connection, 7)
+    _create_indexes(connection, 'uq_feedback_dean_faculty_semester')
+    rebuild_feedback_rollups(connection)
+    return deleted
+
+MIGRATIONS = [
+    (1, "Add access path indexes and unique student feedback", _migrate_access_path_indexes),
+    (2, "Add per-faculty feedback rollups", _migrate_feedback_rollups),
+    (3, "Add publication DOI index", _migrate_publication_doi_index),
+    (4, "Add full-text search over publications and feedback comments", _migrate_search_index),
+    (5, "Add case-insensitive user name indexes for the faculty picker", _migrate_user_search_indexes),
+    (6, "Add (username, role) login index", _migrate_login_index),
+    (7, "Keep one dean rating per faculty per semester", _migrate_unique_dean_feedback),
+]
+
+def run_migrations(bind=None, allow_deletes=False):
+    """Apply pending schema migrations in version order
+    
+    Returns (version, description, deleted rows) for each migration applied. A
+    migration that would delete rows only runs with allow_deletes, otherwise
+    DestructiveMigrationPending is raised before it and later migrations wait.
+    """
+    bind = bind or engine
+    applied_now = []
+    with bind.begin() as connection:
+        SchemaMigration.__table__.create(connection, checkfirst=True)
+        applied = set(connection.execute(text("SELECT version FROM schema_migrations")).scalars())
+    
+    for version, description, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        
+        # Each migration commits together with its version row
+        with bind.begin() as connection:
+            if not allow_deletes:
+                rows = _count_migration_deletes(connection, version)
+                if rows:
+                    raise DestructiveMigrationPending(version, description, rows)
+            
+            deleted = migrate(connection) or 0
+            connection.execute(
+                SchemaMigration.__table__.insert().values(version=version, description=description)
+            )
+        applied_now.append((version, description, deleted))
+    
+    return applied_now
+
 # Create tables in the database
 Base.metadata.create_all(engine)
 
+# Upgrade databases created before the current schema. Migrations that would delete
+# duplicate ratings are left to `python manage.py migrate`; app.py shows this error
+# instead of the dashboards until then.
+try:
+    run_migrations()
+    PENDING_MIGRATION_ERROR = None
+except DestructiveMigrationPending as error:
+    logger.warning(str(error))
+    PENDING_MIGRATION_ERROR = error
+
 # Create a session factory
-SessionFactory = sessionmaker(bind=engine)
+# Objects stay readable after commit so they can be returned from a session scope
+SessionFactory = sessionmaker(bind=engine, expire_on_commit=False)
+
+# Session shared by nested data access calls on the current thread
+_scope = threading.local()
 
 # Function to get a database session
 def get_db_session():
     """Get a new database session"""
     return SessionFactory()
 
+@contextmanager
+def session_scope():
+    """Provide a session shared by every data access call made inside the block"""
+    session = getattr(_scope, 'session', None)
+    if session is not None:
+        # Nested call, reuse the session owned by the outermost scope
+        yield session
+        return
+    
+    session = SessionFactory()
+    _scope.session = session
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        _scope.session = None
+        session.close()
+
+def is_lock_error(error):
+    """Check if a database error was caused by lock contention"""
+    return isinstance(error, OperationalError) and 'database is locked' in str(error.orig)
+
+def retry_on_lock(func):
+    """Retry a write function with backoff when the database is locked"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        for attempt in range(LOCK_RETRY_ATTEMPTS):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as error:
+                if not is_lock_error(error) or attempt == LOCK_RETRY_ATTEMPTS - 1:
+                    raise
+                
+                # Discard the failed transaction before trying again in a shared scope
+                session = getattr(_scope, 'session', None)
+                if session is not None:
+                    session.rollback()
+                
+                delay = LOCK_RETRY_BASE_DELAY * (2 ** attempt)
+                time.sleep(delay + random.uniform(0, delay))
+    return wrapper
+
 # Function to initialize sample data if tables are empty
 def initialize_sample_data():
     """Initialize sample data if tables are empty"""
-    session = get_db_session()
-    
-    # Check if users table is empty
-    if session.query(User).count() == 0:
-        # Create sample users
-        sample_users = [
-            User(username="john", password="faculty123", name="John Smith", role="faculty"),
-            User(username="jane", password="dean123", name="Jane Doe", role="dean"),
-            User(username="mike", password="student123", name="Mike Johnson", role="student")
-        ]
-        session.add_all(sample_users)
-        session.commit()
-    
-    session.close()
+    with session_scope() as session:
+        # Check if users table is empty
+        if session.query(User).count() == 0:
+            # Create sample users
+            sample_users = [
+                User(username="john", password=hash_password("faculty123"), name="John Smith", role="faculty"),
+                User(username="jane", password=hash_password("dean123"), name="Jane Doe", role="dean"),
+                User(username="mike", password=hash_password("student123"), name="Mike Johnson", role="student")
+            ]
+            session.add_all(sample_users)
+            session.commit()
 
 # Initialize sample data
 #initialize_sample_data()
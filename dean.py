@@ -1,112 +1,314 @@
+import os
+import tempfile
 import streamlit as st
 import pandas as pd
 from auth import get_current_user
 from data_manager import (
-    get_all_faculty, get_faculty_publications, get_faculty_experiences,
-    get_feedback_summary, add_feedback, get_current_semester
+    PAGE_SIZE, get_faculty_profile, get_faculty_publications_page, get_faculty_experiences_page, get_feedback_summary, get_rating_trend, get_dean_feedback, upsert_dean_feedback, get_current_semester, get_department_overview
 )
+from search import SEARCH_PAGE_SIZE, search_publications, search_feedback_comments
+from profiling import profiled_dashboard, profile_section
+from components import get_paged_records, render_load_more, faculty_picker, render_rating_trend
+from appraisal_export import DATASETS, EXPORT_FORMATS, SINGLE_DATASET_FORMATS, MIME_TYPES, write_export
 
+# Overview columns the table can be sorted by, with their labels
+OVERVIEW_SORT_COLUMNS = {
+    'avg_rating': "Average Rating",
+    'rating_count': "Ratings",
+    'publications': "Publications",
+    'experiences': "Experiences",
+    'name': "Name",
+}
+
+def render_department_overview():
+    """Render the department leaderboard, sorted and filtered in pandas"""
+    st.write("### Department Overview")
+    
+    overview = pd.DataFrame(get_department_overview())
+    if overview.empty:
+        st.info("No faculty members are registered in the system.")
+        return
+    
+    # Rank by average rating, faculty without ratings stay unranked
+    overview['rank'] = overview['avg_rating'].rank(method='min', ascending=False).astype('Int64')
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        name_filter = st.text_input("Filter by name", key="dean_overview_filter")
+    with col2:
+        min_ratings = st.number_input("Minimum ratings", min_value=0, value=0, step=1, key="dean_overview_min_ratings")
+    with col3:
+        sort_column = st.selectbox(
+            "Sort by",
+            list(OVERVIEW_SORT_COLUMNS),
+            format_func=OVERVIEW_SORT_COLUMNS.get,
+            key="dean_overview_sort"
+        )
+    
+    total = len(overview)
+    if name_filter:
+        overview = overview[
+            overview['name'].str.contains(name_filter, case=False, regex=False)
+            | overview['username'].str.contains(name_filter, case=False, regex=False)
+        ]
+    overview = overview[overview['rating_count'] >= min_ratings]
+    overview = overview.sort_values(sort_column, ascending=sort_column == 'name', na_position='last')
+    
+    st.caption(f"Showing {len(overview)} of {total} faculty members")
+    st.dataframe(
+        overview[['rank', 'name', 'username', 'avg_rating', 'rating_count', 'student_count',
+                  'dean_count', 'publications', 'experiences']],
+        column_config={
+            'rank': "Rank",
+            'name': "Name",
+            'username': "Username",
+            'avg_rating': st.column_config.NumberColumn("Average Rating", format="%.2f"),
+            'rating_count': "Ratings",
+            'student_count': "From Students",
+            'dean_count': "From Dean",
+            'publications': "Publications",
+            'experiences': "Experiences"
+        },
+        hide_index=True,
+        use_container_width=True
+    )
+
+# Searchable content, with its search function and the result columns shown
+SEARCH_SCOPES = {
+    "Publications": (search_publications, ['faculty_name', 'title', 'journal', 'year', 'doi']),
+    "Feedback Comments": (search_feedback_comments, ['faculty_name', 'source', 'rating', 'semester', 'comment']),
+}
+
+def _move_search_page(step):
+    """Move the search results to the previous or next page"""
+    st.session_state.dean_search_offset = max(0, st.session_state.dean_search_offset + step)
+
+def render_search():
+    """Render ranked full-text search over publications and feedback comments"""
+    st.write("### Search")
+    
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        query = st.text_input("Search for", placeholder="e.g. machine learning", key="dean_search_query")
+    with col2:
+        scope = st.selectbox("Search in", list(SEARCH_SCOPES), key="dean_search_scope")
+    
+    # Start from the first page whenever the search changes
+    if st.session_state.get('dean_search_key') != (query, scope):
+        st.session_state.dean_search_key = (query, scope)
+        st.session_state.dean_search_offset = 0
+    offset = st.session_state.dean_search_offset
+    
+    if not query:
+        st.caption("Search publication titles and journals, or the comments left in feedback.")
+        return
+    
+    search, columns = SEARCH_SCOPES[scope]
+    results, has_more = search(query, offset=offset)
+    if not results:
+        st.info("No matches found.")
+        return
+    
+    st.caption(f"Results {offset + 1}-{offset + len(results)}, best matches first")
+    st.dataframe(
+        pd.DataFrame(results)[columns],
+        column_config={
+            'faculty_name': "Faculty",
+            'title': "Title",
+            'journal': "Journal",
+            'year': st.column_config.NumberColumn("Year", format="%d"),
+            'doi': "DOI",
+            'source': "From",
+            'rating': "Rating",
+            'semester': "Semester",
+            'comment': "Comment"
+        },
+        hide_index=True,
+        use_container_width=True
+    )
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.button("Previous", disabled=offset == 0, key="dean_search_previous",
+                  on_click=_move_search_page, args=(-SEARCH_PAGE_SIZE,))
+    with col2:
+        st.button("Next", disabled=not has_more, key="dean_search_next",
+                  on_click=_move_search_page, args=(SEARCH_PAGE_SIZE,))
+
+@profiled_dashboard
 def dean_dashboard():
     user = get_current_user()
     
     st.header("Faculty Management Dashboard")
     
-    # Get list of all faculty
-    faculty_list = get_all_faculty()
-    
-    if not faculty_list:
-        st.warning("No faculty members are registered in the system.")
-    else:
-        # Create a dropdown to select faculty
-        faculty_names = [f['name'] for f in faculty_list]
-        faculty_usernames = [f['username'] for f in faculty_list]
-        
-        selected_faculty_index = st.selectbox(
-            "Select Faculty Member to View/Provide Feedback",
-            range(len(faculty_list)),
-            format_func=lambda i: faculty_names[i]
-        )
-        
-        selected_faculty_username = faculty_usernames[selected_faculty_index]
-        selected_faculty_name = faculty_names[selected_faculty_index]
+    # Department-wide export, written to a temporary file in chunks
+    with st.expander("Export Department Appraisal"), profile_section("Export"):
+        file_format = st.selectbox("Format", EXPORT_FORMATS, format_func=str.upper, key="dean_export_format")
+        if file_format in SINGLE_DATASET_FORMATS:
+            datasets = [st.selectbox("Dataset", list(DATASETS), format_func=str.title, key="dean_export_dataset")]
+        else:
+            datasets = st.multiselect("Sheets", list(DATASETS), default=list(DATASETS), format_func=str.title, key="dean_export_sheets")
         
-        st.subheader(f"Information for {selected_faculty_name}")
-        
-        # Tab navigation for selected faculty
-        tabs = st.tabs(["Publications", "Experience", "Feedback"])
-        
-        # Publications Tab
-        with tabs[0]:
-            st.write("### Publications")
-            publications = get_faculty_publications(selected_faculty_username)
-            
-            if not publications:
-                st.info(f"{selected_faculty_name} hasn't added any publications yet.")
-            else:
-                pub_df = pd.DataFrame(publications)
-                pub_df = pub_df[['title', 'journal', 'year', 'doi']]
-                st.dataframe(pub_df, use_container_width=True)
-        
-        # Experiences Tab
-        with tabs[1]:
-            st.write("### Experience")
-            experiences = get_faculty_experiences(selected_faculty_username)
-            
-            if not experiences:
-                st.info(f"{selected_faculty_name} hasn't added any experiences yet.")
-            else:
-                for exp in experiences:
-                    with st.expander(f"{exp['role']} at {exp['institution']}", expanded=False):
-                        st.write(f"**Duration:** {exp['duration']}")
-                        st.write(f"**Description:** {exp['description']}")
+        # Writing the file stays flat in memory, but st.download_button reads the whole
+        # file into Streamlit's in-memory media store, so the download holds the full
+        # export in memory. It is offered on the rerun that prepared it and the temporary
+        # file goes right after; large exports belong to `manage.py export`.
+        st.caption("The download is held in server memory; export large departments with `python manage.py export`.")
+        if st.button("Prepare Export", disabled=not datasets):
+            handle, path = tempfile.mkstemp(suffix=f".{file_format}")
+            try:
+                with os.fdopen(handle, 'wb') as output:
+                    write_export(output, file_format, datasets)
+                
+                file_name = f"appraisal_{'_'.join(datasets)}.{file_format}"
+                with open(path, 'rb') as export_file:
+                    st.download_button(
+                        f"Download {file_name}",
+                        export_file,
+                        file_name=file_name,
+                        mime=MIME_TYPES[file_format]
+                    )
+            except (RuntimeError, ValueError) as error:
+                st.error(str(error))
+            finally:
+                os.remove(path)
+    
+    overview_tab, faculty_tab, search_tab = st.tabs(["Department Overview", "Faculty Details", "Search"])
+    
+    with overview_tab, profile_section("Department Overview"):
+        render_department_overview()
+    
+    with search_tab, profile_section("Search"):
+        render_search()
+    
+    with faculty_tab, profile_section("Faculty Details"):
+        # Candidates are searched as the dean types instead of listing every faculty member
+        selected_faculty = faculty_picker("Find Faculty Member to View/Provide Feedback", key="dean_faculty")
         
-        # Feedback Tab
-        with tabs[2]:
-            st.write("### Feedback Summary")
-            
-            # Get feedback summary
-            feedback_summary = get_feedback_summary(selected_faculty_username)
+        if selected_faculty is not None:
+            selected_faculty_username = selected_faculty['username']
+            selected_faculty_name = selected_faculty['name']
             
-            # Display feedback stats
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                st.metric("Average Rating", f"{feedback_summary['avg_rating']} / 5.0")
-            with col2:
-                st.metric("From Students", feedback_summary['student_count'])
-            with col3:
-                st.metric("From Dean", feedback_summary['dean_count'])
+            st.subheader(f"Information for {selected_faculty_name}")
             
-            # Provide feedback form
-            st.write("### Provide Feedback")
+            # Only the visible section is loaded, its first page and row count in one statement
+            section = st.radio(
+                "Section",
+                ["Publications", "Experience", "Feedback"],
+                horizontal=True,
+                label_visibility="collapsed",
+                key="dean_faculty_section"
+            )
+            faculty_id = selected_faculty['id']
+            if section != "Feedback":
+                profile_section_key = {'Publications': 'publications', 'Experience': 'experiences'}[section]
+                profile = get_faculty_profile(
+                    selected_faculty_username, sections=(profile_section_key,), faculty_id=faculty_id, limit=PAGE_SIZE
+                )
             
-            feedback_already_given = False
-            for feedback in feedback_summary['feedback']:
-                if feedback['dean_username'] == user['username'] and feedback['semester'] == get_current_semester():
-                    feedback_already_given = True
-                    st.info("You have already provided feedback for this faculty this semester, but you can update it.")
-                    break
+            # Publications Section
+            if section == "Publications":
+                with profile_section("Publications"):
+                    st.write("### Publications")
+                    
+                    # Later pages are fetched by keyset and kept in session state between reruns
+                    publications_key = f"dean_publications_{faculty_id}"
+                    fetch_publications = lambda after_id: get_faculty_publications_page(
+                        selected_faculty_username, after_id=after_id, faculty_id=faculty_id
+                    )
+                    publications = get_paged_records(
+                        publications_key, profile['totals']['publications'], fetch_publications, profile['version'],
+                        first_page=(profile['publications'], profile['next_after_id']['publications'])
+                    )
+                    
+                    if not publications:
+                        st.info(f"{selected_faculty_name} hasn't added any publications yet.")
+                    else:
+                        pub_df = pd.DataFrame(publications)
+                        pub_df = pub_df[['title', 'journal', 'year', 'doi']]
+                        st.dataframe(pub_df, use_container_width=True)
+                        render_load_more(publications_key, fetch_publications, "Load more publications")
             
-            with st.form("dean_feedback_form"):
-                st.write(f"Providing feedback for: **{selected_faculty_name}**")
-                st.write(f"Current Semester: **{get_current_semester()}**")
-                
-                rating = st.slider("Rating (1-5 stars)", 1, 5, 3)
-                comment = st.text_area("Comments (optional)")
-                
-                submit_button = st.form_submit_button("Submit Feedback")
-                
-                if submit_button:
-                    success, message = add_feedback(
-                        from_username=user['username'],
-                        from_role='dean',
-                        faculty_username=selected_faculty_username,
-                        rating=rating,
-                        comment=comment,
-                        semester=get_current_semester()
+            # Experiences Section
+            elif section == "Experience":
+                with profile_section("Experience"):
+                    st.write("### Experience")
+                    
+                    experiences_key = f"dean_experiences_{faculty_id}"
+                    fetch_experiences = lambda after_id: get_faculty_experiences_page(
+                        selected_faculty_username, after_id=after_id, faculty_id=faculty_id
+                    )
+                    experiences = get_paged_records(
+                        experiences_key, profile['totals']['experiences'], fetch_experiences, profile['version'],
+                        first_page=(profile['experiences'], profile['next_after_id']['experiences'])
                     )
                     
-                    if success:
-                        st.success(message)
-                        st.rerun()
+                    if not experiences:
+                        st.info(f"{selected_faculty_name} hasn't added any experiences yet.")
                     else:
-                        st.error(message)
+                        for exp in experiences:
+                            with st.expander(f"{exp['role']} at {exp['institution']}", expanded=False):
+                                st.write(f"**Duration:** {exp['duration']}")
+                                st.write(f"**Description:** {exp['description']}")
+                        render_load_more(experiences_key, fetch_experiences, "Load more experiences")
+            
+            # Feedback Section
+            else:
+                with profile_section("Feedback"):
+                    st.write("### Feedback Summary")
+                    
+                    # Rollup totals only, the individual feedback rows are not needed here
+                    feedback_summary = get_feedback_summary(selected_faculty_username, faculty_id=faculty_id)
+                    
+                    # Display feedback stats
+                    col1, col2, col3 = st.columns(3)
+                    with col1:
+                        st.metric("Average Rating", f"{feedback_summary['avg_rating']} / 5.0")
+                    with col2:
+                        st.metric("From Students", feedback_summary['student_count'])
+                    with col3:
+                        st.metric("From Dean", feedback_summary['dean_count'])
+                    
+                    st.write("### Rating Trend")
+                    render_rating_trend(get_rating_trend(selected_faculty_username, faculty_id=faculty_id))
+                    
+                    # Provide feedback form
+                    st.write("### Provide Feedback")
+                    
+                    current_semester = get_current_semester()
+                    existing_feedback = get_dean_feedback(
+                        user['username'], selected_faculty_username, current_semester,
+                        dean_id=user['id'], faculty_id=faculty_id
+                    )
+                    
+                    # An update starts from the rating already given
+                    default_rating, default_comment = 3, ""
+                    if existing_feedback is not None:
+                        st.info("You have already provided feedback for this faculty this semester, but you can update it.")
+                        default_rating, default_comment = int(existing_feedback['rating']), existing_feedback['comment'] or ""
+                    
+                    with st.form("dean_feedback_form"):
+                        st.write(f"Providing feedback for: **{selected_faculty_name}**")
+                        st.write(f"Current Semester: **{current_semester}**")
+                        
+                        rating = st.slider("Rating (1-5 stars)", 1, 5, default_rating)
+                        comment = st.text_area("Comments (optional)", default_comment)
+                        
+                        submit_button = st.form_submit_button("Update Feedback" if existing_feedback else "Submit Feedback")
+                        
+                        if submit_button:
+                            success, message = upsert_dean_feedback(
+                                user['username'],
+                                selected_faculty_username,
+                                rating,
+                                comment,
+                                current_semester,
+                                dean_id=user['id'],
+                                faculty_id=faculty_id
+                            )
+                            
+                            if success:
+                                st.success(message)
+                                st.rerun()
+                            else:
+                                st.error(message)
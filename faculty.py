@@ -2,23 +2,38 @@ import streamlit as st
 import pandas as pd
 from auth import get_current_user
 from data_manager import (
-    get_faculty_publications, add_publication, update_publication, delete_publication,
-    get_faculty_experiences, add_experience, update_experience, delete_experience,
-    get_feedback_summary
+    get_faculty_publications_page, add_publication, update_publication, delete_publication,
+    get_faculty_experiences_page, add_experience, update_experience, delete_experience,
+    get_faculty_feedback_page, get_faculty_record_counts, get_feedback_summary, get_rating_trend
 )
+from components import get_paged_records, render_load_more, reset_paged_records, render_rating_trend
+from publication_import import import_publications, detect_format
+from profiling import profiled_dashboard, profile_section
 
+@profiled_dashboard
 def faculty_dashboard():
     user = get_current_user()
     
+    # Session state keys of the paginated lists, per user
+    publications_key = f"faculty_publications_{user['id']}"
+    experiences_key = f"faculty_experiences_{user['id']}"
+    feedback_key = f"faculty_feedback_{user['id']}"
+    
+    # Record totals decide whether the loaded pages are still current
+    record_counts = get_faculty_record_counts(user['username'], faculty_id=user['id'])
+    fetch_publications = lambda after_id: get_faculty_publications_page(user['username'], after_id=after_id, faculty_id=user['id'])
+    fetch_experiences = lambda after_id: get_faculty_experiences_page(user['username'], after_id=after_id, faculty_id=user['id'])
+    fetch_feedback = lambda after_id: get_faculty_feedback_page(user['username'], after_id=after_id, faculty_id=user['id'])
+    
     # Tab navigation
     tabs = st.tabs(["Publications", "Experiences", "Feedback"])
     
     # Publications Tab
-    with tabs[0]:
+    with tabs[0], profile_section("Publications"):
         st.header("My Publications")
         
-        # Get existing publications
-        publications = get_faculty_publications(user['username'])
+        # Get the first page of existing publications
+        publications = get_paged_records(publications_key, record_counts['publications'], fetch_publications, record_counts['version'])
         
         # Add new publication form
         with st.expander("Add New Publication", expanded=False):
@@ -32,12 +47,35 @@ def faculty_dashboard():
                 
                 if submit_button:
                     if pub_title and pub_journal and pub_year and pub_doi:
-                        add_publication(user['username'], pub_title, pub_journal, pub_year, pub_doi)
+                        add_publication(user['username'], pub_title, pub_journal, pub_year, pub_doi, faculty_id=user['id'])
+                        reset_paged_records(publications_key)
                         st.success("Publication added successfully!")
                         st.rerun()
                     else:
                         st.error("All fields are required.")
         
+        # Bulk import from a bibliography file
+        with st.expander("Import Publications (CSV/BibTeX)", expanded=False):
+            st.caption("CSV files need title, journal, year and doi columns. Publications whose DOI you already have are skipped.")
+            import_file = st.file_uploader("Bibliography file", type=["csv", "bib", "bibtex"], key="publication_import_file")
+            
+            if import_file is not None and st.button("Import Publications", key="publication_import_btn"):
+                try:
+                    report = import_publications(
+                        user['username'], import_file, detect_format(import_file.name), faculty_id=user['id']
+                    )
+                except ValueError as error:
+                    st.error(f"The file could not be imported: {error}")
+                else:
+                    reset_paged_records(publications_key)
+                    st.success(f"Imported {report['imported']} publications, skipped {report['duplicates']} duplicates.")
+                    if report['errors']:
+                        st.warning(f"{len(report['errors'])} entries could not be imported.")
+                        st.dataframe(
+                            pd.DataFrame(report['errors'], columns=["Line", "Error"]),
+                            use_container_width=True
+                        )
+        
         # Display existing publications
         if not publications:
             st.info("You haven't added any publications yet.")
@@ -59,6 +97,7 @@ def faculty_dashboard():
                     # Handle delete
                     if delete_clicked:
                         delete_publication(pub['id'])
+                        reset_paged_records(publications_key)
                         st.success("Publication deleted!")
                         st.rerun()
                     
@@ -75,17 +114,20 @@ def faculty_dashboard():
                             if update_button:
                                 if edit_title and edit_journal and edit_year and edit_doi:
                                     update_publication(pub['id'], edit_title, edit_journal, edit_year, edit_doi)
+                                    reset_paged_records(publications_key)
                                     st.success("Publication updated successfully!")
                                     st.rerun()
                                 else:
                                     st.error("All fields are required.")
-                                    
+            
+            render_load_more(publications_key, fetch_publications, "Load more publications")
+    
     # Experiences Tab
-    with tabs[1]:
+    with tabs[1], profile_section("Experiences"):
         st.header("My Teaching & Industry Experience")
         
-        # Get existing experiences
-        experiences = get_faculty_experiences(user['username'])
+        # Get the first page of existing experiences
+        experiences = get_paged_records(experiences_key, record_counts['experiences'], fetch_experiences, record_counts['version'])
         
         # Add new experience form
         with st.expander("Add New Experience", expanded=False):
@@ -99,7 +141,8 @@ def faculty_dashboard():
                 
                 if submit_button:
                     if exp_institution and exp_role and exp_duration:
-                        add_experience(user['username'], exp_institution, exp_role, exp_duration, exp_description)
+                        add_experience(user['username'], exp_institution, exp_role, exp_duration, exp_description, faculty_id=user['id'])
+                        reset_paged_records(experiences_key)
                         st.success("Experience added successfully!")
                         st.rerun()
                     else:
@@ -125,6 +168,7 @@ def faculty_dashboard():
                     # Handle delete
                     if delete_clicked:
                         delete_experience(exp['id'])
+                        reset_paged_records(experiences_key)
                         st.success("Experience deleted!")
                         st.rerun()
                     
@@ -141,17 +185,20 @@ def faculty_dashboard():
                             if update_button:
                                 if edit_institution and edit_role and edit_duration:
                                     update_experience(exp['id'], edit_institution, edit_role, edit_duration, edit_description)
+                                    reset_paged_records(experiences_key)
                                     st.success("Experience updated successfully!")
                                     st.rerun()
                                 else:
                                     st.error("Institution, Role, and Duration are required.")
+            
+            render_load_more(experiences_key, fetch_experiences, "Load more experiences")
     
     # Feedback Tab
-    with tabs[2]:
+    with tabs[2], profile_section("Feedback"):
         st.header("Feedback Received")
         
         # Get feedback summary
-        feedback_summary = get_feedback_summary(user['username'])
+        feedback_summary = get_feedback_summary(user['username'], faculty_id=user['id'])
         
         # Display feedback summary
         col1, col2, col3 = st.columns(3)
@@ -162,12 +209,17 @@ def faculty_dashboard():
         with col3:
             st.metric("From Dean", feedback_summary['dean_count'])
         
-        # Display individual feedback
-        if not feedback_summary['feedback']:
+        # How the rating moved across semesters
+        st.write("### Rating Trend")
+        render_rating_trend(get_rating_trend(user['username'], faculty_id=user['id']))
+        
+        # Display individual feedback, one page at a time
+        feedback_list = get_paged_records(feedback_key, record_counts['feedback'], fetch_feedback, record_counts['version'])
+        if not feedback_list:
             st.info("You haven't received any feedback yet.")
         else:
             st.write("### Individual Feedback")
-            for feedback in feedback_summary['feedback']:
+            for feedback in feedback_list:
                 source = "Dean" if feedback['dean_username'] else "Student"
                 with st.container():
                     st.markdown(f"**From:** {source} | **Rating:** {feedback['rating']}/5 | **Date:** {feedback['timestamp']}")
@@ -175,3 +227,5 @@ def faculty_dashboard():
                     if feedback['comment']:
                         st.markdown(f"**Comment:** {feedback['comment']}")
                     st.divider()
+            
+            render_load_more(feedback_key, fetch_feedback, "Load more feedback")
@@ -0,0 +1,200 @@
+import csv
+import time
+from sqlalchemy import insert, or_, tuple_
+from sqlalchemy.exc import IntegrityError
+from db_setup import session_scope, retry_on_lock, User, Feedback
+from data_manager import RATING_SCALE, feedback_rollup_delta, apply_feedback_rollup_deltas
+from cache import department_overview, rating_trends, record_versions
+
+# Rows inserted per transaction
+INGEST_CHUNK_SIZE = 5000
+
+# Columns of an ingestion file, in the order of the add_feedback arguments
+INGEST_COLUMNS = ['from_username', 'from_role', 'faculty_username', 'rating', 'comment', 'semester']
+
+# Extra columns written to the reject file
+REJECT_COLUMNS = ['line', 'reason']
+
+def _load_user_map(session):
+    """Map every username to its (id, role) with one query"""
+    return {
+        username: (user_id, role)
+        for username, user_id, role in session.query(User.username, User.id, User.role)
+    }
+
+def _feedback_key(row):
+    """Get the (role, reviewer ID, faculty ID, semester) key a feedback row must be unique on"""
+    if row['student_id'] is not None:
+        return ('student', row['student_id'], row['faculty_id'], row['semester'])
+    return ('dean', row['dean_id'], row['faculty_id'], row['semester'])
+
+def _load_semester_keys(session, semester):
+    """Get the (role, reviewer ID, faculty ID) keys that already have feedback in a semester"""
+    return {
+        ('student', student_id, faculty_id) if student_id is not None else ('dean', dean_id, faculty_id)
+        for student_id, dean_id, faculty_id in session.query(
+            Feedback.student_id, Feedback.dean_id, Feedback.faculty_id
+        ).filter(Feedback.semester == semester)
+    }
+
+def _add_rollup_delta(deltas, row):
+    """Accumulate the rollup change for one feedback row"""
+    source_role = 'student' if row['student_id'] is not None else 'dean'
+    key = (row['faculty_id'], row['semester'], source_role)
+    delta = feedback_rollup_delta(row['rating'])
+    total = deltas.setdefault(key, dict.fromkeys(delta, 0))
+    for column, value in delta.items():
+        total[column] += value
+
+class FeedbackIngestor:
+    """Stream feedback rows into the database in chunked transactions
+    
+    Usernames are resolved once through an in-memory map and duplicates are checked
+    against (reviewer, faculty, semester) keys preloaded per semester,
+    so a row costs no extra queries. Rejected rows are written to reject_stream
+    as CSV with the line number and reason appended.
+    """
+    
+    def __init__(self, reject_stream=None, chunk_size=INGEST_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.reject_writer = None
+        if reject_stream is not None:
+            self.reject_writer = csv.DictWriter(reject_stream, fieldnames=INGEST_COLUMNS + REJECT_COLUMNS, extrasaction='ignore')
+            self.reject_writer.writeheader()
+        self.report = {'rows': 0, 'inserted': 0, 'rejected': 0}
+        self._users = None
+        self._existing = {}
+    
+    def _reject(self, line_number, record, reason):
+        """Count a rejected row and write it to the reject file"""
+        self.report['rejected'] += 1
+        if self.reject_writer is not None:
+            self.reject_writer.writerow(dict(record, line=line_number, reason=reason))
+    
+    def _prepare(self, session, record):
+        """Validate one record and build its Feedback values, raising ValueError when it is rejected"""
+        from_role = (record.get('from_role') or 'student').strip().lower()
+        if from_role not in ('student', 'dean'):
+            raise ValueError(f"Unknown role {from_role!r}.")
+        
+        from_user = self._users.get((record.get('from_username') or '').strip())
+        if from_user is None or from_user[1] != from_role:
+            raise ValueError(f"No {from_role} named {record.get('from_username')!r}.")
+        faculty = self._users.get((record.get('faculty_username') or '').strip())
+        if faculty is None or faculty[1] != 'faculty':
+            raise ValueError(f"No faculty named {record.get('faculty_username')!r}.")
+        
+        semester = (record.get('semester') or '').strip()
+        if not semester:
+            raise ValueError("Semester is required.")
+        try:
+            rating = float(record.get('rating'))
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid rating {record.get('rating')!r}.")
+        if not RATING_SCALE[0] <= rating <= RATING_SCALE[-1]:
+            raise ValueError(f"Rating must be between {RATING_SCALE[0]} and {RATING_SCALE[-1]}.")
+        
+        # One student or dean rating per faculty per semester, including earlier rows of this file
+        if semester not in self._existing:
+            self._existing[semester] = _load_semester_keys(session, semester)
+        key = (from_role, from_user[0], faculty[0])
+        if key in self._existing[semester]:
+            raise ValueError("Duplicate feedback for this faculty and semester.")
+        self._existing[semester].add(key)
+        
+        return {
+            'faculty_id': faculty[0],
+            'student_id': from_user[0] if from_role == 'student' else None,
+            'dean_id': from_user[0] if from_role == 'dean' else None,
+            'rating': rating,
+            'comment': (record.get('comment') or '').strip() or None,
+            'semester': semester
+        }
+    
+    @retry_on_lock
+    def _insert_chunk(self, rows):
+        """Insert one chunk of feedback rows and their rollup changes in a single transaction"""
+        with session_scope() as session:
+            deltas = {}
+            for row in rows:
+                _add_rollup_delta(deltas, row)
+            session.execute(insert(Feedback), rows)
+            apply_feedback_rollup_deltas(session, deltas)
+            session.commit()
+        department_overview.invalidate()
+        rating_trends.invalidate(*{row['faculty_id'] for row in rows})
+        record_versions.bump(*{row['faculty_id'] for row in rows})
+    
+    def _flush(self, session, chunk):
+        """Write a chunk, dropping rows that a concurrent writer inserted after the keys were loaded"""
+        rows = [row for _, _, row in chunk]
+        try:
+            self._insert_chunk(rows)
+        except IntegrityError:
+            session.rollback()
+            keys = [_feedback_key(row) for row in rows]
+            taken = {
+                _feedback_key({'student_id': student_id, 'dean_id': dean_id, 'faculty_id': faculty_id, 'semester': semester})
+                for student_id, dean_id, faculty_id, semester in session.query(
+                    Feedback.student_id, Feedback.dean_id, Feedback.faculty_id, Feedback.semester
+                ).filter(or_(
+                    tuple_(Feedback.student_id, Feedback.faculty_id, Feedback.semester).in_(
+                        [key[1:] for key in keys if key[0] == 'student']
+                    ),
+                    tuple_(Feedback.dean_id, Feedback.faculty_id, Feedback.semester).in_(
+                        [key[1:] for key in keys if key[0] == 'dean']
+                    )
+                ))
+            }
+            kept = []
+            for line_number, record, row in chunk:
+                if _feedback_key(row) in taken:
+                    self._reject(line_number, record, "Duplicate feedback for this faculty and semester.")
+                else:
+                    kept.append(row)
+            if kept:
+                self._insert_chunk(kept)
+            rows = kept
+        self.report['inserted'] += len(rows)
+    
+    def ingest(self, records):
+        """Ingest an iterable of (line number, record dict) pairs and return the report"""
+        started = time.perf_counter()
+        
+        # One session for the whole run, each chunk commits its own transaction
+        with session_scope() as session:
+            self._users = _load_user_map(session)
+            
+            chunk = []
+            for line_number, record in records:
+                self.report['rows'] += 1
+                try:
+                    row = self._prepare(session, record)
+                except ValueError as error:
+                    self._reject(line_number, record, str(error))
+                    continue
+                
+                chunk.append((line_number, record, row))
+                if len(chunk) >= self.chunk_size:
+                    self._flush(session, chunk)
+                    chunk = []
+            
+            if chunk:
+                self._flush(session, chunk)
+        
+        elapsed = time.perf_counter() - started
+        self.report['seconds'] = round(elapsed, 3)
+        self.report['rows_per_second'] = round(self.report['rows'] / elapsed, 1) if elapsed else 0
+        return self.report
+
+def iter_feedback_csv(stream):
+    """Yield (line number, record) for each row of a feedback CSV file"""
+    reader = csv.DictReader(stream)
+    if reader.fieldnames:
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+    for record in reader:
+        yield reader.line_num, record
+
+def ingest_feedback_file(stream, reject_stream=None, chunk_size=INGEST_CHUNK_SIZE):
+    """Ingest a feedback CSV file, writing rejected rows to reject_stream"""
+    return FeedbackIngestor(reject_stream, chunk_size).ingest(iter_feedback_csv(stream))
@@ -0,0 +1,113 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+# Route add_feedback through the background writer, enabled with FEEDBACK_WRITER=1
+FEEDBACK_WRITER_ENABLED = os.environ.get('FEEDBACK_WRITER', '').lower() in ('1', 'true', 'yes')
+
+# Submissions waiting for the writer before new ones are turned away
+FEEDBACK_WRITER_QUEUE = int(os.environ.get('FEEDBACK_WRITER_QUEUE', 2000))
+
+# Most rows per transaction, and how long the writer waits for more rows to join one
+FEEDBACK_WRITER_BATCH = int(os.environ.get('FEEDBACK_WRITER_BATCH', 500))
+FEEDBACK_WRITER_WINDOW_MS = float(os.environ.get('FEEDBACK_WRITER_WINDOW_MS', 5))
+
+# Seconds a submission waits for room in a full queue
+FEEDBACK_WRITER_SUBMIT_TIMEOUT = 2
+
+class FeedbackWriter:
+    """Background thread that groups queued feedback inserts into one transaction per batch
+    
+    write_batch takes a list of queued items and returns one result per item. When a
+    batch fails as a whole its items are retried one per transaction, so an error
+    only reaches the submitters whose own row caused it.
+    """
+    
+    def __init__(self, write_batch, queue_size=FEEDBACK_WRITER_QUEUE, batch_size=FEEDBACK_WRITER_BATCH,
+                 window_ms=FEEDBACK_WRITER_WINDOW_MS):
+        self.write_batch = write_batch
+        self.batch_size = batch_size
+        self.window = window_ms / 1000
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.batches = 0
+        self.rows = 0
+        self.largest_batch = 0
+        self.rejected = 0
+    
+    def _ensure_started(self):
+        """Start the writer thread on first use"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='feedback-writer', daemon=True)
+                self._thread.start()
+    
+    def submit(self, item, busy_result=None):
+        """Queue an item for the next batch and get a future of its result
+        
+        When the queue stays full the future resolves to busy_result right away.
+        """
+        self._ensure_started()
+        future = Future()
+        try:
+            self._queue.put((item, future), timeout=FEEDBACK_WRITER_SUBMIT_TIMEOUT)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            future.set_result(busy_result)
+        return future
+    
+    def _next_batch(self):
+        """Wait for one item, then collect whatever else arrives within the batch window"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+    
+    def _write_each(self, batch):
+        """Write the items of a failed batch in separate transactions"""
+        for item, future in batch:
+            try:
+                future.set_result(self.write_batch([item])[0])
+            except Exception as error:
+                future.set_exception(error)
+    
+    def _run(self):
+        """Write batches until the process exits"""
+        while True:
+            batch = self._next_batch()
+            try:
+                results = self.write_batch([item for item, _ in batch])
+            except Exception as error:
+                if len(batch) == 1:
+                    batch[0][1].set_exception(error)
+                else:
+                    self._write_each(batch)
+            else:
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            
+            with self._lock:
+                self.batches += 1
+                self.rows += len(batch)
+                self.largest_batch = max(self.largest_batch, len(batch))
+    
+    def stats(self):
+        """Get batch counters and the current queue depth"""
+        with self._lock:
+            return {
+                'batches': self.batches,
+                'rows': self.rows,
+                'rows_per_batch': round(self.rows / self.batches, 1) if self.batches else 0,
+                'largest_batch': self.largest_batch,
+                'rejected': self.rejected,
+                'queued': self._queue.qsize()
+            }
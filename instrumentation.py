@@ -0,0 +1,195 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+import pandas as pd
+import streamlit as st
+from sqlalchemy import event
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from db_setup import engine
+
+logger = logging.getLogger(__name__)
+
+# Statements slower than this many milliseconds go to the slow-query log
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+
+# Upper bounds in milliseconds of the latency histogram buckets
+HISTOGRAM_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, float('inf'))
+
+# Recent reruns and slow statements kept in memory
+RECENT_RERUNS = 100
+SLOW_QUERY_LOG_SIZE = 200
+
+# Longest statement text kept in the slow-query log
+MAX_STATEMENT_LENGTH = 500
+
+def _bucket_label(bound):
+    """Label a histogram bucket by its upper bound"""
+    return "inf" if bound == float('inf') else f"<={bound}ms"
+
+class QueryStats:
+    """Process-wide SQL statement counts and latencies, attributed to the Streamlit rerun that issued them"""
+    
+    def __init__(self, slow_query_ms=SLOW_QUERY_MS):
+        self.slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._rerun_counter = 0
+        self.reset()
+    
+    def reset(self):
+        """Clear every counter, rerun record and slow-query entry"""
+        with self._lock:
+            self.statements = 0
+            self.db_ms = 0.0
+            self.histogram = [0] * len(HISTOGRAM_BUCKETS_MS)
+            self.dashboards = {}
+            self.reruns = deque(maxlen=RECENT_RERUNS)
+            self.slow_queries = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+    
+    def current_rerun(self):
+        """Get the rerun record of the calling thread, or None outside a tracked rerun"""
+        return getattr(self._local, 'rerun', None)
+    
+    @contextmanager
+    def track_rerun(self, dashboard=None):
+        """Attribute the statements executed inside the block to one Streamlit rerun"""
+        ctx = get_script_run_ctx()
+        with self._lock:
+            self._rerun_counter += 1
+            rerun = {
+                'rerun': self._rerun_counter,
+                'session': ctx.session_id if ctx else None,
+                'dashboard': dashboard,
+                'started_at': time.time(),
+                'statements': 0,
+                'db_ms': 0.0,
+                'slowest_ms': 0.0
+            }
+        self._local.rerun = rerun
+        started = time.perf_counter()
+        try:
+            yield rerun
+        finally:
+            # st.rerun() and st.stop() end the block with a BaseException, still record the rerun
+            self._local.rerun = None
+            rerun['wall_ms'] = round((time.perf_counter() - started) * 1000, 3)
+            rerun['db_ms'] = round(rerun['db_ms'], 3)
+            with self._lock:
+                self.reruns.append(rerun)
+                totals = self.dashboards.setdefault(rerun['dashboard'] or 'none', {'reruns': 0, 'statements': 0, 'db_ms': 0.0})
+                totals['reruns'] += 1
+                totals['statements'] += rerun['statements']
+                totals['db_ms'] += rerun['db_ms']
+    
+    def set_dashboard(self, dashboard):
+        """Name the dashboard the current rerun renders, once it is known"""
+        rerun = self.current_rerun()
+        if rerun is not None:
+            rerun['dashboard'] = dashboard
+    
+    def record(self, statement, elapsed_ms):
+        """Count one executed statement"""
+        rerun = self.current_rerun()
+        bucket = next(i for i, bound in enumerate(HISTOGRAM_BUCKETS_MS) if elapsed_ms <= bound)
+        with self._lock:
+            self.statements += 1
+            self.db_ms += elapsed_ms
+            self.histogram[bucket] += 1
+            if rerun is not None:
+                rerun['statements'] += 1
+                rerun['db_ms'] += elapsed_ms
+                rerun['slowest_ms'] = max(rerun['slowest_ms'], round(elapsed_ms, 3))
+        
+        if elapsed_ms >= self.slow_query_ms:
+            entry = {
+                'at': time.time(),
+                'ms': round(elapsed_ms, 3),
+                'dashboard': rerun['dashboard'] if rerun else None,
+                'rerun': rerun['rerun'] if rerun else None,
+                'statement': ' '.join(statement.split())[:MAX_STATEMENT_LENGTH]
+            }
+            with self._lock:
+                self.slow_queries.append(entry)
+            logger.warning("Slow query (%.1f ms, %s): %s", elapsed_ms, entry['dashboard'], entry['statement'])
+    
+    def snapshot(self):
+        """Get all counters as a JSON-serializable dict"""
+        with self._lock:
+            return {
+                'statements': self.statements,
+                'db_ms': round(self.db_ms, 3),
+                'slow_query_ms': self.slow_query_ms,
+                'histogram': {
+                    _bucket_label(bound): count for bound, count in zip(HISTOGRAM_BUCKETS_MS, self.histogram)
+                },
+                'dashboards': {
+                    name: dict(totals, db_ms=round(totals['db_ms'], 3)) for name, totals in self.dashboards.items()
+                },
+                'reruns': [dict(rerun) for rerun in self.reruns],
+                'slow_queries': list(self.slow_queries)
+            }
+    
+    def dump(self, path):
+        """Write the snapshot to a JSON file"""
+        with open(path, 'w') as output:
+            json.dump(self.snapshot(), output, indent=2)
+
+# Shared by every Streamlit session in this process
+query_stats = QueryStats()
+
+def install(bind=engine):
+    """Time every statement executed through an engine"""
+    if getattr(bind, '_query_stats_installed', False):
+        return
+    
+    @event.listens_for(bind, 'before_cursor_execute')
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+    
+    @event.listens_for(bind, 'after_cursor_execute')
+    def stop_timer(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['query_started'].pop()
+        query_stats.record(statement, (time.perf_counter() - started) * 1000)
+    
+    bind._query_stats_installed = True
+
+def debug_panel_enabled():
+    """Check whether the SQL debug panel should be shown"""
+    return os.environ.get('SQL_DEBUG_PANEL', '').lower() in ('1', 'true', 'yes')
+
+def render_debug_panel():
+    """Render SQL statistics for recent reruns in the sidebar"""
+    stats = query_stats.snapshot()
+    with st.sidebar.expander("SQL Debug"):
+        if stats['reruns']:
+            last = stats['reruns'][-1]
+            col1, col2 = st.columns(2)
+            with col1:
+                st.metric("Last Rerun Queries", last['statements'])
+            with col2:
+                st.metric("Last Rerun DB Time", f"{last['db_ms']:.1f} ms")
+            st.caption(f"Dashboard: {last['dashboard'] or 'none'} · wall time {last['wall_ms']:.0f} ms")
+        
+        st.write("**Latency histogram**")
+        st.bar_chart(pd.Series(stats['histogram'], name="statements"))
+        
+        st.write("**Recent reruns**")
+        reruns = pd.DataFrame(stats['reruns'][-20:][::-1])
+        if not reruns.empty:
+            st.dataframe(reruns[['rerun', 'dashboard', 'statements', 'db_ms', 'slowest_ms', 'wall_ms']],
+                         hide_index=True, use_container_width=True)
+        
+        st.write(f"**Slow queries** (>= {stats['slow_query_ms']:.0f} ms)")
+        if stats['slow_queries']:
+            st.dataframe(pd.DataFrame(stats['slow_queries'][::-1])[['ms', 'dashboard', 'rerun', 'statement']],
+                         hide_index=True, use_container_width=True)
+        else:
+            st.caption("None recorded.")
+        
+        st.download_button("Download stats JSON", json.dumps(stats, indent=2),
+                           file_name="sql_stats.json", mime="application/json")
+        st.button("Reset stats", on_click=query_stats.reset)
@@ -0,0 +1,94 @@
+"""Maintenance commands for the Faculty Appraisal System database.
+
+Run with `python manage.py <command> --help` to see the options for each command.
+"""
+import argparse
+from db_setup import engine, run_migrations, rebuild_feedback_rollups, rebuild_search_index
+from publication_import import import_publications, detect_format
+from feedback_ingest import ingest_feedback_file
+from appraisal_export import DATASETS, EXPORT_FORMATS, SINGLE_DATASET_FORMATS, write_export
+
+def migrate(args):
+    """Apply pending schema migrations, including those that delete duplicate ratings"""
+    for version, description, deleted in run_migrations(allow_deletes=True):
+        print(f"Applied migration {version}: {description}" + (f", deleted {deleted} duplicate feedback rows" if deleted else ""))
+    print("Database schema is up to date.")
+
+def rebuild_rollups(args):
+    """Recompute the feedback rollup table from raw feedback"""
+    with engine.begin() as connection:
+        rebuild_feedback_rollups(connection)
+    print("Feedback rollups rebuilt.")
+
+def rebuild_search(args):
+    """Rebuild the full-text search index over publications and feedback comments"""
+    with engine.begin() as connection:
+        rebuild_search_index(connection)
+    print("Search index rebuilt.")
+
+def import_publications_file(args):
+    """Import publications for a faculty member from a CSV or BibTeX file"""
+    file_format = args.format or detect_format(args.file)
+    with open(args.file, 'rb') as stream:
+        report = import_publications(args.faculty, stream, file_format, batch_size=args.batch_size)
+    
+    for line_number, message in report['errors']:
+        print(f"line {line_number}: {message}")
+    print(f"Imported {report['imported']} publications, skipped {report['duplicates']} duplicates, "
+          f"rejected {len(report['errors'])}.")
+
+def ingest_feedback(args):
+    """Ingest a CSV file of feedback ratings in chunked transactions"""
+    reject_path = args.rejects or f"{args.file}.rejects.csv"
+    with open(args.file, encoding='utf-8-sig', newline='') as stream, \
+            open(reject_path, 'w', encoding='utf-8', newline='') as reject_stream:
+        report = ingest_feedback_file(stream, reject_stream, chunk_size=args.chunk_size)
+    
+    print(f"Ingested {report['inserted']} of {report['rows']} rows in {report['seconds']}s "
+          f"({report['rows_per_second']} rows/s), rejected {report['rejected']}.")
+    if report['rejected']:
+        print(f"Rejected rows written to {reject_path}")
+
+def export(args):
+    """Export department-wide appraisal data to CSV, Parquet or XLSX"""
+    datasets = args.dataset or list(DATASETS)
+    with open(args.output, 'wb') as output:
+        write_export(output, args.format, datasets, chunk_size=args.chunk_size)
+    print(f"Exported {', '.join(datasets)} to {args.output}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    commands.add_parser('migrate', help=migrate.__doc__).set_defaults(handler=migrate)
+    commands.add_parser('rebuild-rollups', help=rebuild_rollups.__doc__).set_defaults(handler=rebuild_rollups)
+    commands.add_parser('rebuild-search', help=rebuild_search.__doc__).set_defaults(handler=rebuild_search)
+    
+    importer = commands.add_parser('import-publications', help=import_publications_file.__doc__)
+    importer.add_argument('--faculty', required=True, help="username of the faculty member")
+    importer.add_argument('--file', required=True)
+    importer.add_argument('--format', choices=['csv', 'bibtex'], help="defaults to the file extension")
+    importer.add_argument('--batch-size', type=int, default=500)
+    importer.set_defaults(handler=import_publications_file)
+    
+    ingester = commands.add_parser('ingest-feedback', help=ingest_feedback.__doc__)
+    ingester.add_argument('--file', required=True, help="CSV with from_username, from_role, faculty_username, rating, comment, semester")
+    ingester.add_argument('--rejects', help="reject file path, defaults to <file>.rejects.csv")
+    ingester.add_argument('--chunk-size', type=int, default=5000)
+    ingester.set_defaults(handler=ingest_feedback)
+    
+    exporter = commands.add_parser('export', help=export.__doc__)
+    exporter.add_argument('--format', choices=EXPORT_FORMATS, required=True)
+    exporter.add_argument('--dataset', choices=list(DATASETS), action='append', help="repeat for several XLSX sheets, defaults to all")
+    exporter.add_argument('--output', required=True)
+    exporter.add_argument('--chunk-size', type=int, default=2000)
+    exporter.set_defaults(handler=export)
+    
+    args = parser.parse_args()
+    # Checked before the output file is opened, which would truncate it
+    if args.command == 'export' and args.format in SINGLE_DATASET_FORMATS and len(args.dataset or []) != 1:
+        exporter.error(f"--format {args.format} holds one dataset, name it with a single --dataset")
+    args.handler(args)
+
+if __name__ == "__main__":
+    main()
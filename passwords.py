@@ -0,0 +1,119 @@
+import os
+import hmac
+import base64
+import hashlib
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Hash scheme for new passwords: 'scrypt' or 'pbkdf2_sha256'
+PASSWORD_SCHEME = os.environ.get('PASSWORD_SCHEME', 'scrypt')
+
+# Cost parameters; raising them makes logins slower and offline guessing harder.
+# Stored hashes made with other parameters are rehashed at the next login.
+SCRYPT_N = int(os.environ.get('SCRYPT_N', 2 ** 14))
+SCRYPT_R = 8
+SCRYPT_P = 1
+PBKDF2_ITERATIONS = int(os.environ.get('PBKDF2_ITERATIONS', 600000))
+
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+# Threads hashing passwords, and how many hashes may be running or queued at
+# once before further logins are turned away instead of piling up
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1)))
+PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', 64))
+
+class PasswordHasherBusy(RuntimeError):
+    """Raised when too many password hashes are already running or queued"""
+
+def _b64encode(data):
+    """Encode bytes as base64 text"""
+    return base64.b64encode(data).decode('ascii')
+
+def _derive(scheme, password, salt, params):
+    """Derive the hash of a password with a scheme's cost parameters"""
+    if scheme == 'scrypt':
+        n, r, p = params
+        # OpenSSL rejects scrypt calls whose memory use exceeds maxmem
+        return hashlib.scrypt(password.encode('utf-8'), salt=salt, n=n, r=r, p=p,
+                              maxmem=256 * n * r + 1024 * 1024, dklen=HASH_BYTES)
+    if scheme == 'pbkdf2_sha256':
+        (iterations,) = params
+        return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations, dklen=HASH_BYTES)
+    raise ValueError(f"Unknown password scheme {scheme!r}.")
+
+def _current_params(scheme):
+    """Get the configured cost parameters of a scheme"""
+    return (SCRYPT_N, SCRYPT_R, SCRYPT_P) if scheme == 'scrypt' else (PBKDF2_ITERATIONS,)
+
+def hash_password(password, scheme=None, params=None):
+    """Hash a password with a random salt, as '<scheme>$<params>$<salt>$<hash>'"""
+    scheme = scheme or PASSWORD_SCHEME
+    params = params or _current_params(scheme)
+    salt = secrets.token_bytes(SALT_BYTES)
+    digest = _derive(scheme, password, salt, params)
+    return '$'.join([scheme, ','.join(str(value) for value in params), _b64encode(salt), _b64encode(digest)])
+
+def is_password_hash(stored):
+    """Check whether a stored password is a hash rather than a legacy plaintext value"""
+    return stored.split('$', 1)[0] in ('scrypt', 'pbkdf2_sha256') and stored.count('$') == 3
+
+def verify_password(password, stored):
+    """Check a password against a stored hash or legacy plaintext value
+    
+    Returns (matches, needs_rehash). Plaintext values and hashes made with other
+    than the configured scheme and cost need rehashing once the password matches.
+    """
+    if not is_password_hash(stored):
+        return hmac.compare_digest(password.encode('utf-8'), stored.encode('utf-8')), True
+    
+    scheme, params, salt, digest = stored.split('$')
+    params = tuple(int(value) for value in params.split(','))
+    matches = hmac.compare_digest(_derive(scheme, password, base64.b64decode(salt), params), base64.b64decode(digest))
+    return matches, (scheme, params) != (PASSWORD_SCHEME, _current_params(PASSWORD_SCHEME))
+
+class PasswordHasher:
+    """Bounded thread pool that hashes and verifies passwords
+    
+    The calling script thread still waits for each result, so a login rerun is as
+    long as its hash. What the pool adds is a cap on how many cores and how much
+    scrypt memory logins take during a spike, and work beyond the queue limit
+    raises PasswordHasherBusy instead of queueing without end.
+    """
+    
+    def __init__(self, workers=PASSWORD_HASH_WORKERS, queue_size=PASSWORD_HASH_QUEUE):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._dummy_hash = None
+    
+    def _run(self, fn, *args):
+        """Run one hashing call in the pool and wait for its result"""
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy("Too many logins are being processed, please try again in a moment.")
+        try:
+            return self._executor.submit(fn, *args).result()
+        finally:
+            self._slots.release()
+    
+    def hash(self, password):
+        """Hash a password for storage"""
+        return self._run(hash_password, password)
+    
+    def verify(self, password, stored):
+        """Verify a password, returning (matches, needs_rehash)"""
+        return self._run(verify_password, password, stored)
+    
+    def verify_unknown_user(self, password):
+        """Spend one verification on a login for a user that does not exist
+        
+        Failing fast would let response times reveal which usernames are registered.
+        """
+        if self._dummy_hash is None:
+            self._dummy_hash = hash_password(secrets.token_hex(16))
+        self._run(verify_password, password, self._dummy_hash)
+
+# Shared by every Streamlit session in this process
+password_hasher = PasswordHasher()
@@ -0,0 +1,145 @@
+import os
+import time
+import cProfile
+import functools
+import threading
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+import pandas as pd
+import streamlit as st
+from instrumentation import query_stats
+
+# Per-section timing of the role dashboards, enabled with RENDER_PROFILING=1
+RENDER_PROFILING = os.environ.get('RENDER_PROFILING', '').lower() in ('1', 'true', 'yes')
+
+# Optional per-rerun capture: 'cprofile' writes .prof files for pstats/snakeviz,
+# 'tracemalloc' writes snapshots for tracemalloc.Snapshot.load
+RENDER_PROFILE_CAPTURE = os.environ.get('RENDER_PROFILE_CAPTURE', '').lower()
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+
+# Stack depth of the allocation tracebacks kept by tracemalloc
+TRACEMALLOC_FRAMES = 25
+
+# Recent profiled reruns kept in memory
+RECENT_PROFILES = 50
+
+class RenderProfiler:
+    """Times dashboard sections per rerun, splitting each section's time into DB and other work"""
+    
+    def __init__(self, capture=RENDER_PROFILE_CAPTURE, profile_dir=PROFILE_DIR):
+        self.capture = capture
+        self.profile_dir = profile_dir
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._counter = 0
+        self.reruns = deque(maxlen=RECENT_PROFILES)
+    
+    def _capture_path(self, dashboard, extension):
+        """Build a unique output path for one rerun's capture"""
+        os.makedirs(self.profile_dir, exist_ok=True)
+        with self._lock:
+            self._counter += 1
+            counter = self._counter
+        return os.path.join(self.profile_dir, f"{dashboard}-{time.strftime('%Y%m%d-%H%M%S')}-{counter}.{extension}")
+    
+    @contextmanager
+    def profile_rerun(self, dashboard):
+        """Collect the sections of one dashboard render, with an optional cProfile or tracemalloc capture"""
+        record = {'dashboard': dashboard, 'started_at': time.time(), 'sections': [], 'capture': None}
+        self._local.record = record
+        self._local.stack = []
+        
+        profiler = None
+        if self.capture == 'cprofile':
+            profiler = cProfile.Profile()
+            profiler.enable()
+        elif self.capture == 'tracemalloc':
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+            tracemalloc.reset_peak()
+        
+        started = time.perf_counter()
+        try:
+            with self.section(dashboard):
+                yield record
+        finally:
+            # Also reached when st.rerun() ends the render early
+            record['ms'] = round((time.perf_counter() - started) * 1000, 3)
+            if profiler is not None:
+                profiler.disable()
+                record['capture'] = self._capture_path(dashboard, 'prof')
+                profiler.dump_stats(record['capture'])
+            elif self.capture == 'tracemalloc':
+                # tracemalloc is process-wide, so concurrent sessions show up in the snapshot
+                record['peak_kb'] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+                record['capture'] = self._capture_path(dashboard, 'tracemalloc')
+                tracemalloc.take_snapshot().dump(record['capture'])
+            
+            self._local.record = None
+            with self._lock:
+                self.reruns.append(record)
+    
+    @contextmanager
+    def section(self, name):
+        """Time a block of a dashboard render, nested under the enclosing section"""
+        record = getattr(self._local, 'record', None)
+        if record is None:
+            yield
+            return
+        
+        stack = self._local.stack
+        stack.append(name)
+        entry = {'section': '/'.join(stack), 'depth': len(stack) - 1}
+        record['sections'].append(entry)
+        
+        rerun = query_stats.current_rerun()
+        statements, db_ms = (rerun['statements'], rerun['db_ms']) if rerun else (0, 0.0)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry['ms'] = round((time.perf_counter() - started) * 1000, 3)
+            if rerun is not None:
+                entry['db_ms'] = round(rerun['db_ms'] - db_ms, 3)
+                entry['statements'] = rerun['statements'] - statements
+            stack.pop()
+    
+    def snapshot(self):
+        """Get the recent profiled reruns as JSON-serializable dicts"""
+        with self._lock:
+            return [dict(record) for record in self.reruns]
+
+# Shared by every Streamlit session in this process
+render_profiler = RenderProfiler()
+
+def profiled_dashboard(dashboard):
+    """Profile every call of a role dashboard function when render profiling is enabled"""
+    @functools.wraps(dashboard)
+    def wrapper(*args, **kwargs):
+        if not RENDER_PROFILING:
+            return dashboard(*args, **kwargs)
+        with render_profiler.profile_rerun(dashboard.__name__):
+            return dashboard(*args, **kwargs)
+    return wrapper
+
+def profile_section(name):
+    """Time a section of a dashboard; a no-op unless render profiling is enabled"""
+    return render_profiler.section(name)
+
+def render_profile_panel():
+    """Render the section timings of the last profiled rerun in the sidebar"""
+    reruns = render_profiler.snapshot()
+    with st.sidebar.expander("Render Profile"):
+        if not reruns:
+            st.caption("No dashboard has been profiled yet.")
+            return
+        
+        last = reruns[-1]
+        st.caption(f"{last['dashboard']} · {last['ms']:.0f} ms")
+        sections = pd.DataFrame(last['sections'])
+        sections['section'] = sections['depth'].map(lambda depth: "· " * depth) + sections['section'].str.split('/').str[-1]
+        columns = [column for column in ('section', 'ms', 'db_ms', 'statements') if column in sections]
+        st.dataframe(sections[columns], hide_index=True, use_container_width=True)
+        if last['capture']:
+            st.caption(f"Capture written to `{last['capture']}`")
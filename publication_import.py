@@ -0,0 +1,240 @@
+import io
+import re
+import csv
+from sqlalchemy import insert
+from db_setup import session_scope, retry_on_lock, Publication
+from data_manager import resolve_user_id
+from cache import department_overview, record_versions
+
+# Rows inserted per transaction
+IMPORT_BATCH_SIZE = 500
+
+# Limits of the Publication columns and the publication form
+MAX_TITLE_LENGTH = 200
+MAX_JOURNAL_LENGTH = 200
+MAX_DOI_LENGTH = 100
+MIN_YEAR = 1900
+MAX_YEAR = 2100
+
+# Prefixes people paste in front of a DOI
+DOI_PREFIX = re.compile(r'^(?:https?://(?:dx\.)?doi\.org/|doi:\s*)', re.IGNORECASE)
+
+# BibTeX field assignment, e.g. `title = {A Study},`
+BIBTEX_FIELD = re.compile(r'(\w+)\s*=\s*')
+
+# Start of a BibTeX entry, e.g. `@article{` or `@book(`; other text with an @ is a comment
+BIBTEX_ENTRY = re.compile(r'\s*@(\w+)\s*([{(])')
+
+def normalize_doi(doi):
+    """Normalize a DOI to its lowercase '10.xxxx/...' form, or None if it is not a DOI"""
+    if not doi:
+        return None
+    doi = DOI_PREFIX.sub('', doi.strip()).strip().lower()
+    return doi if doi.startswith('10.') and '/' in doi else None
+
+def iter_csv_publications(stream):
+    """Yield (line number, fields) for each row of a CSV file with title, journal, year and doi columns"""
+    reader = csv.DictReader(stream)
+    if reader.fieldnames:
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+    
+    for row in reader:
+        yield reader.line_num, {
+            'title': row.get('title'),
+            'journal': row.get('journal'),
+            'year': row.get('year'),
+            'doi': row.get('doi')
+        }
+
+def _read_bibtex_value(body, start):
+    """Read a braced, quoted or bare BibTeX value starting at an index, returning it and the end index"""
+    if body[start] == '{':
+        depth = 0
+        for end in range(start, len(body)):
+            if body[end] == '{':
+                depth += 1
+            elif body[end] == '}':
+                depth -= 1
+                if depth == 0:
+                    return body[start + 1:end], end + 1
+        return body[start + 1:], len(body)
+    
+    if body[start] == '"':
+        end = body.find('"', start + 1)
+        end = len(body) if end == -1 else end
+        return body[start + 1:end], end + 1
+    
+    match = re.match(r'[^,})\s]*', body[start:])
+    return match.group(0), start + match.end()
+
+def _parse_bibtex_entry(body):
+    """Get the lowercase field names and values of one BibTeX entry body"""
+    fields = {}
+    position = body.find(',') + 1  # skip the citation key
+    while True:
+        match = BIBTEX_FIELD.search(body, position)
+        if not match or match.end() >= len(body):
+            return fields
+        value, position = _read_bibtex_value(body, match.end())
+        # Drop case-protecting braces and collapse line breaks
+        fields[match.group(1).lower()] = ' '.join(value.replace('{', '').replace('}', '').split())
+
+def iter_bibtex_publications(stream):
+    """Yield (line number, fields) for each entry of a BibTeX file, reading it line by line"""
+    entry_lines = []
+    entry_line_number = 0
+    depth = 0
+    for line_number, line in enumerate(stream, start=1):
+        if not entry_lines:
+            start = BIBTEX_ENTRY.match(line)
+            if not start:
+                continue
+            entry_type = start.group(1).lower()
+            opening = start.group(2)
+            closing = '}' if opening == '{' else ')'
+            line = line[start.end(2) - 1:]
+            entry_line_number = line_number
+        
+        entry_lines.append(line)
+        depth += line.count(opening) - line.count(closing)
+        if depth > 0:
+            continue
+        
+        entry = ''.join(entry_lines)
+        entry_lines = []
+        depth = 0
+        
+        if entry_type in ('comment', 'preamble', 'string'):
+            continue
+        
+        fields = _parse_bibtex_entry(entry[1:])
+        yield entry_line_number, {
+            'title': fields.get('title'),
+            'journal': fields.get('journal') or fields.get('booktitle'),
+            'year': fields.get('year'),
+            'doi': fields.get('doi')
+        }
+
+PARSERS = {
+    'csv': iter_csv_publications,
+    'bibtex': iter_bibtex_publications,
+}
+
+class UndecodableLine(ValueError):
+    """Raised when a line of an import file is not UTF-8 text"""
+    
+    def __init__(self, line_number):
+        super().__init__("Not valid UTF-8 text; save the file as UTF-8 and import the rest again.")
+        self.line_number = line_number
+
+def _decode_lines(stream):
+    """Decode a binary stream as UTF-8 one line at a time, so a bad byte is reported with its line"""
+    for line_number, line in enumerate(stream, start=1):
+        try:
+            yield line.decode('utf-8-sig' if line_number == 1 else 'utf-8')
+        except UnicodeDecodeError:
+            raise UndecodableLine(line_number)
+
+def detect_format(filename):
+    """Guess the import format from a file name"""
+    return 'bibtex' if filename.lower().endswith(('.bib', '.bibtex')) else 'csv'
+
+def _validate(fields):
+    """Check one parsed record, returning the Publication values or raising ValueError"""
+    title = (fields.get('title') or '').strip()
+    journal = (fields.get('journal') or '').strip()
+    if not title or not journal:
+        raise ValueError("Title and journal are required.")
+    if len(title) > MAX_TITLE_LENGTH or len(journal) > MAX_JOURNAL_LENGTH:
+        raise ValueError(f"Title and journal must be at most {MAX_TITLE_LENGTH} characters.")
+    
+    raw_year = (fields.get('year') or '').strip()
+    if not raw_year:
+        raise ValueError("Year is required.")
+    try:
+        year = int(raw_year)
+    except ValueError:
+        raise ValueError(f"Invalid year {raw_year!r}.")
+    if not MIN_YEAR <= year <= MAX_YEAR:
+        raise ValueError(f"Year must be between {MIN_YEAR} and {MAX_YEAR}.")
+    
+    raw_doi = (fields.get('doi') or '').strip()
+    doi = normalize_doi(raw_doi)
+    if raw_doi and not doi:
+        raise ValueError(f"Invalid DOI {raw_doi!r}.")
+    if doi and len(doi) > MAX_DOI_LENGTH:
+        raise ValueError(f"DOI must be at most {MAX_DOI_LENGTH} characters.")
+    
+    return {'title': title, 'journal': journal, 'year': year, 'doi': doi}
+
+@retry_on_lock
+def _insert_batch(rows):
+    """Insert a batch of publication rows in one executemany transaction"""
+    with session_scope() as session:
+        session.execute(insert(Publication), rows)
+        session.commit()
+    department_overview.invalidate()
+    record_versions.bump(*{row['faculty_id'] for row in rows})
+
+def _existing_dois(faculty_id):
+    """Get the normalized DOIs a faculty member already has, read through the (faculty_id, doi) index"""
+    with session_scope() as session:
+        dois = session.query(Publication.doi).filter(
+            Publication.faculty_id == faculty_id,
+            Publication.doi.isnot(None)
+        ).all()
+    return {normalize_doi(doi) for (doi,) in dois} - {None}
+
+def import_publications(faculty_username, stream, file_format='csv', batch_size=IMPORT_BATCH_SIZE, faculty_id=None):
+    """Import publications from a CSV or BibTeX text stream, skipping DOIs the faculty already has
+    
+    Returns a report with the number of imported and duplicate rows and a list of
+    (line number, message) errors for rows that were rejected. A file that stops
+    decoding or parsing part way ends the import with an error for that line; the
+    rows before it are still imported.
+    """
+    report = {'imported': 0, 'duplicates': 0, 'errors': []}
+    faculty_id = resolve_user_id(faculty_username, faculty_id)
+    if faculty_id is None:
+        report['errors'].append((0, "Faculty member not found."))
+        return report
+    
+    if isinstance(stream, (bytes, bytearray)):
+        stream = io.BytesIO(stream)
+    if not isinstance(stream, io.TextIOBase):
+        stream = _decode_lines(stream)
+    
+    seen_dois = _existing_dois(faculty_id)
+    batch = []
+    line_number = 0
+    try:
+        for line_number, fields in PARSERS[file_format](stream):
+            try:
+                values = _validate(fields)
+            except ValueError as error:
+                report['errors'].append((line_number, str(error)))
+                continue
+            
+            # Skip DOIs already stored or seen earlier in this file
+            if values['doi']:
+                if values['doi'] in seen_dois:
+                    report['duplicates'] += 1
+                    continue
+                seen_dois.add(values['doi'])
+            
+            batch.append(dict(values, faculty_id=faculty_id))
+            if len(batch) >= batch_size:
+                _insert_batch(batch)
+                report['imported'] += len(batch)
+                batch = []
+    except UndecodableLine as error:
+        report['errors'].append((error.line_number, str(error)))
+    except (UnicodeDecodeError, csv.Error) as error:
+        # Text streams decode ahead of the parser, so the line is the one after the last record read
+        report['errors'].append((line_number + 1, f"Could not read the rest of the file: {error}"))
+    
+    if batch:
+        _insert_batch(batch)
+        report['imported'] += len(batch)
+    
+    return report
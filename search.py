@@ -0,0 +1,126 @@
+import re
+from sqlalchemy import and_, case, text
+from db_setup import session_scope, search_index_supported, User, Publication, Feedback
+
+# Results per page of a search
+SEARCH_PAGE_SIZE = 20
+
+# Ranking scores every match, so searches matching at least this many rows are
+# listed newest first instead of by relevance
+RANK_CANDIDATE_LIMIT = 2000
+
+def search_terms(query):
+    """Split free text into search terms, dropping FTS5 operators and punctuation"""
+    return re.findall(r'\w+', query or '')
+
+def _match_expression(terms):
+    """Build an FTS5 query where every term must match, the last one as a word prefix"""
+    return ' '.join([f'"{term}"' for term in terms[:-1]] + [f'"{terms[-1]}"*'])
+
+def _hits(session, table, terms, limit, offset):
+    """Build the FTS5 subquery of one page of matches and its ordering, with bound parameters"""
+    params = {'match': _match_expression(terms), 'limit': limit + 1, 'offset': offset}
+    candidates = session.execute(text(
+        f"SELECT count(*) FROM (SELECT rowid FROM {table} WHERE {table} MATCH :match LIMIT :cap)"
+    ), dict(params, cap=RANK_CANDIDATE_LIMIT)).scalar()
+    
+    if candidates < RANK_CANDIDATE_LIMIT:
+        columns, order = "rowid, rank", "rank"
+    else:
+        columns, order = "rowid", "rowid DESC"
+    subquery = f"(SELECT {columns} FROM {table} WHERE {table} MATCH :match ORDER BY {order} LIMIT :limit OFFSET :offset) AS hits"
+    return subquery, f"hits.{order}", params
+
+def _page(rows, limit):
+    """Split limit + 1 fetched rows into a page and whether more results follow"""
+    return rows[:limit], len(rows) > limit
+
+def search_publications(query, limit=SEARCH_PAGE_SIZE, offset=0):
+    """Search publication titles and journals, best matches first
+    
+    Every term must match, the last one as a word prefix. Searches too broad to rank
+    come back newest first. Returns one page of results and whether more follow.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return [], False
+    
+    with session_scope() as session:
+        if search_index_supported(session.connection()):
+            hits, order, params = _hits(session, 'publications_fts', terms, limit, offset)
+            rows = session.execute(text(
+                "SELECT p.id, u.username, u.name, p.title, p.journal, p.year, p.doi "
+                f"FROM {hits} "
+                "JOIN publications p ON p.id = hits.rowid "
+                "JOIN users u ON u.id = p.faculty_id "
+                f"ORDER BY {order}"
+            ), params).all()
+        else:
+            # Without a full-text index every term must appear in the title or journal
+            rows = session.query(
+                Publication.id, User.username, User.name, Publication.title,
+                Publication.journal, Publication.year, Publication.doi
+            ).join(User, Publication.faculty_id == User.id).filter(and_(*[
+                Publication.title.ilike(f"%{term}%") | Publication.journal.ilike(f"%{term}%") for term in terms
+            ])).order_by(Publication.id.desc()).limit(limit + 1).offset(offset).all()
+    
+    rows, has_more = _page(rows, limit)
+    results = []
+    for pub_id, username, name, title, journal, year, doi in rows:
+        results.append({
+            'id': pub_id,
+            'faculty_username': username,
+            'faculty_name': name,
+            'title': title,
+            'journal': journal,
+            'year': year,
+            'doi': doi
+        })
+    
+    return results, has_more
+
+def search_feedback_comments(query, limit=SEARCH_PAGE_SIZE, offset=0):
+    """Search feedback comments, best matches first
+    
+    Matching works as in search_publications. Reviewers are reported by role only,
+    as on the dashboards. Returns one page of results and whether more results follow.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return [], False
+    
+    with session_scope() as session:
+        if search_index_supported(session.connection()):
+            hits, order, params = _hits(session, 'feedback_fts', terms, limit, offset)
+            rows = session.execute(text(
+                "SELECT f.id, u.username, u.name, "
+                "CASE WHEN f.dean_id IS NOT NULL THEN 'dean' ELSE 'student' END, "
+                "f.rating, f.semester, f.comment "
+                f"FROM {hits} "
+                "JOIN feedback f ON f.id = hits.rowid "
+                "JOIN users u ON u.id = f.faculty_id "
+                f"ORDER BY {order}"
+            ), params).all()
+        else:
+            rows = session.query(
+                Feedback.id, User.username, User.name,
+                case((Feedback.dean_id.isnot(None), 'dean'), else_='student'),
+                Feedback.rating, Feedback.semester, Feedback.comment
+            ).join(User, Feedback.faculty_id == User.id).filter(and_(*[
+                Feedback.comment.ilike(f"%{term}%") for term in terms
+            ])).order_by(Feedback.id.desc()).limit(limit + 1).offset(offset).all()
+    
+    rows, has_more = _page(rows, limit)
+    results = []
+    for feedback_id, username, name, source, rating, semester, comment in rows:
+        results.append({
+            'id': feedback_id,
+            'faculty_username': username,
+            'faculty_name': name,
+            'source': source,
+            'rating': rating,
+            'semester': semester,
+            'comment': comment
+        })
+    
+    return results, has_more
@@ -2,79 +2,79 @@ import streamlit as st
 import pandas as pd
 from auth import get_current_user
 from data_manager import (
-    get_all_faculty, add_feedback, has_given_feedback, 
-    get_current_semester
+    add_feedback, get_feedback_status_for_student, get_current_semester, get_user_by_username
 )
+from profiling import profiled_dashboard, profile_section
+from components import faculty_picker
 
+@profiled_dashboard
 def student_dashboard():
     user = get_current_user()
     
     st.header("Faculty Feedback Dashboard")
     
-    # Get list of all faculty
-    faculty_list = get_all_faculty()
+    current_semester = get_current_semester()
+    st.subheader("Provide Feedback for Faculty")
+    st.write(f"Current Semester: **{current_semester}**")
     
-    if not faculty_list:
-        st.warning("No faculty members are registered in the system.")
-    else:
-        st.subheader("Provide Feedback for Faculty")
-        st.write(f"Current Semester: **{get_current_semester()}**")
-        
-        # Create a dropdown to select faculty
-        faculty_names = [f['name'] for f in faculty_list]
-        faculty_usernames = [f['username'] for f in faculty_list]
-        
-        selected_faculty_index = st.selectbox(
-            "Select Faculty Member",
-            range(len(faculty_list)),
-            format_func=lambda i: faculty_names[i]
-        )
-        
-        selected_faculty_username = faculty_usernames[selected_faculty_index]
-        selected_faculty_name = faculty_names[selected_faculty_index]
-        
-        # Check if student has already given feedback for this faculty this semester
-        current_semester = get_current_semester()
-        already_submitted = has_given_feedback(user['username'], selected_faculty_username, current_semester)
+    # Candidates are searched as the student types instead of listing every faculty member
+    selected_faculty = faculty_picker("Find Faculty Member", key="student_faculty")
+    
+    # Faculty the student has already rated this semester
+    submitted_faculty = get_feedback_status_for_student(user['username'], current_semester, student_id=user['id'])
+    
+    if selected_faculty is not None:
+        selected_faculty_username = selected_faculty['username']
+        selected_faculty_name = selected_faculty['name']
         
-        if already_submitted:
-            st.warning(f"You have already submitted feedback for {selected_faculty_name} this semester ({current_semester}).")
-        else:
-            st.write(f"Providing feedback for: **{selected_faculty_name}**")
+        # Feedback form for the selected faculty
+        with profile_section("Feedback Form"):
+            # Check if student has already given feedback for this faculty this semester
+            already_submitted = selected_faculty_username in submitted_faculty
             
-            with st.form("student_feedback_form"):
-                rating = st.slider("Rating (1-5 stars)", 1, 5, 3)
-                comment = st.text_area("Comments (optional)")
+            if already_submitted:
+                st.warning(f"You have already submitted feedback for {selected_faculty_name} this semester ({current_semester}).")
+            else:
+                st.write(f"Providing feedback for: **{selected_faculty_name}**")
                 
-                submit_button = st.form_submit_button("Submit Feedback")
-                
-                if submit_button:
-                    success, message = add_feedback(
-                        from_username=user['username'],
-                        from_role='student',
-                        faculty_username=selected_faculty_username,
-                        rating=rating,
-                        comment=comment,
-                        semester=current_semester
-                    )
+                with st.form("student_feedback_form"):
+                    rating = st.slider("Rating (1-5 stars)", 1, 5, 3)
+                    comment = st.text_area("Comments (optional)")
+                    
+                    submit_button = st.form_submit_button("Submit Feedback")
                     
-                    if success:
-                        st.success(message)
-                        st.rerun()
-                    else:
-                        st.error(message)
+                    if submit_button:
+                        success, message = add_feedback(
+                            from_username=user['username'],
+                            from_role='student',
+                            faculty_username=selected_faculty_username,
+                            rating=rating,
+                            comment=comment,
+                            semester=current_semester,
+                            from_user_id=user['id']
+                        )
                         
-        # Show a list of faculty for whom the student has already provided feedback
+                        if success:
+                            st.success(message)
+                            st.rerun()
+                        else:
+                            st.error(message)
+    
+    with profile_section("Feedback Status"):
+        # Only the faculty already rated are listed, the directory can be large
         st.subheader("Faculty Feedback Status")
         
-        feedback_status = []
-        for i, faculty in enumerate(faculty_list):
-            status = "Submitted" if has_given_feedback(user['username'], faculty['username'], current_semester) else "Not Submitted"
-            feedback_status.append({
-                "Faculty Name": faculty['name'],
-                "Feedback Status": status,
-                "Semester": current_semester
-            })
-        
-        status_df = pd.DataFrame(feedback_status)
-        st.dataframe(status_df, use_container_width=True)
+        if not submitted_faculty:
+            st.info(f"You haven't submitted any feedback for {current_semester} yet.")
+        else:
+            feedback_status = []
+            for username in submitted_faculty:
+                faculty = get_user_by_username(username)
+                feedback_status.append({
+                    "Faculty Name": faculty.name if faculty else username,
+                    "Feedback Status": "Submitted",
+                    "Semester": current_semester
+                })
+            
+            status_df = pd.DataFrame(feedback_status).sort_values("Faculty Name")
+            st.dataframe(status_df, hide_index=True, use_container_width=True)
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# db_setup connects at import time, so the tests point it at a private in-memory database first
+os.environ['DATABASE_URL'] = 'sqlite://'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
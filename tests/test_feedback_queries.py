@@ -0,0 +1,58 @@
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from db_setup import engine, session_scope, User, Feedback
+from data_manager import get_faculty_feedback
+
+@contextmanager
+def count_statements():
+    """Count the SQL statements run on the engine inside the block"""
+    statements = []
+    
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+def seed_faculty(username, feedback_rows):
+    """Create a faculty member with feedback from a student and a dean, one row per semester"""
+    with session_scope() as session:
+        faculty = User(username=username, password='x', name=username.title(), role='faculty')
+        student = User(username=f"{username}_student", password='x', name="Student", role='student')
+        dean = User(username=f"{username}_dean", password='x', name="Dean", role='dean')
+        session.add_all([faculty, student, dean])
+        session.flush()
+        
+        session.add_all([
+            Feedback(
+                faculty_id=faculty.id,
+                student_id=student.id if i % 2 else None,
+                dean_id=None if i % 2 else dean.id,
+                rating=i % 5 + 1,
+                comment=f"comment {i}",
+                semester=f"Semester {i}"
+            )
+            for i in range(feedback_rows)
+        ])
+        return faculty.id
+
+@pytest.mark.parametrize('feedback_rows', [1, 10, 200])
+def test_faculty_feedback_statement_count_is_constant(feedback_rows):
+    faculty_id = seed_faculty(f"faculty{feedback_rows}", feedback_rows)
+    
+    with count_statements() as statements:
+        feedback = get_faculty_feedback(f"faculty{feedback_rows}", faculty_id=faculty_id)
+    
+    assert len(feedback) == feedback_rows
+    # The student and dean usernames come back from the same query
+    assert feedback[0]['dean_username'] == f"faculty{feedback_rows}_dean"
+    if feedback_rows > 1:
+        assert feedback[1]['student_username'] == f"faculty{feedback_rows}_student"
+    # One joined query however many rows there are, with no per-row user lookups
+    assert len(statements) == 1